@@ -0,0 +1,59 @@
+"""
+Timezone autocomplete: prebuilt TimezoneSearch vs the old linear substring scan
+Run from the repo root: python -m benchmarks.autocomplete
+"""
+import random
+import timeit
+
+from utils.timezones import TimezoneCatalogue, TimezoneSearch, _normalize, load_offset_table
+
+QUERIES = ["", "a", "as", "asia", "asia/k", "kolkata", "kolkatta", "ist", "new york", "america/new_y",
+           "los", "berln", "europe/lon", "tokyo", "gmt", "utc", "pacific/auck", "xyz"]
+
+
+def linear_scan(names, current):
+    current = current.lower()
+    return [tz for tz in names if current in tz.lower()][:20]
+
+
+def missed_substrings(search, names, rng, probes=3000):
+    """
+    Queries cut from random zone names whose substring matches the index leaves out
+    Only checked while the results have room, once they are full ranking decides what is left out
+    """
+    normalized = [_normalize(tz) for tz in names]
+    missed = []
+    for _ in range(probes):
+        name = rng.choice(names).lower()
+        start = rng.randrange(len(name))
+        query = _normalize(name[start:start + rng.randint(1, 8)])
+        results = search.search(query)
+        if query and len(results) < search.limit and not {tz for tz, norm in zip(names, normalized) if query in norm} <= set(results):
+            missed.append(query)
+    return missed
+
+
+def main(number=2000):
+    catalogue = TimezoneCatalogue(load_offset_table("zone_offsets.json"))  # same cache file as the bot
+    search = TimezoneSearch(catalogue)
+    missed = missed_substrings(search, catalogue.names, random.Random(1))
+    assert not missed, missed[:5]
+    print(f"{len(catalogue)} zones, {number} runs per query\n")
+    print(f"{'query':<16}{'linear µs':>12}{'index µs':>12}{'cached µs':>12}  top result")
+    totals = [0, 0, 0]
+    for query in QUERIES:
+        normalized = _normalize(query)
+        timings = [
+            timeit.timeit(lambda: linear_scan(catalogue.names, query), number=number) / number * 1e6,
+            # uncached lookup, what the first user typing this query pays
+            timeit.timeit(lambda: search._search(normalized) if normalized else None, number=number) / number * 1e6,
+            timeit.timeit(lambda: search.search(query), number=number) / number * 1e6,
+        ]
+        totals = [total + timing for total, timing in zip(totals, timings)]
+        top = search.search(query)
+        print(f"{query!r:<16}" + "".join(f"{timing:>12.1f}" for timing in timings) + f"  {top[0] if top else '-'}")
+    print(f"\n{'mean':<16}" + "".join(f"{total / len(QUERIES):>12.1f}" for total in totals))
+
+
+if __name__ == "__main__":
+    main()
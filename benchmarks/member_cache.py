@@ -0,0 +1,118 @@
+"""
+Member cache memory: discord.py defaults vs compact mode (utils.member_cache) on a synthetic guild
+The guild goes through discord.py's own GUILD_CREATE parser, so the numbers are what the real cache holds
+Run from the repo root: python -m benchmarks.member_cache [--members 100000]
+"""
+import argparse
+import asyncio
+import gc
+import random
+import sys
+import tracemalloc
+
+import discord
+
+from utils import member_cache
+
+GUILD_ID = 1100000000000000000
+CHANNEL_ID = 1100000000000000001
+MEMBER_BASE = 1119000000000000000
+ROLE_IDS = [str(1102473000000000000 + i) for i in range(40)]
+
+
+def activity(rng):
+    roll = rng.random()
+    if roll < 0.35:
+        return {"type": 0, "name": rng.choice(["Pokéarena", "Minecraft", "Valorant"]), "created_at": 1700000000000,
+                "application_id": "383226320970055681", "timestamps": {"start": 1700000000000},
+                "details": "In a battle", "state": "Ranked",
+                "assets": {"large_image": "mp:external/abc", "large_text": "Playing", "small_image": "123"}}
+    if roll < 0.45:
+        return {"type": 2, "name": "Spotify", "id": "spotify:1", "created_at": 1700000000000,
+                "details": "Some song", "state": "Some artist", "sync_id": "6rqhFgbbKwnb9MLmUQDhG6",
+                "timestamps": {"start": 1700000000000, "end": 1700000200000}, "party": {"id": "spotify:1"},
+                "assets": {"large_image": "spotify:ab67616d0000b273", "large_text": "Some album"}}
+    return None
+
+
+def guild_payload(count, rng):
+    members, presences = [], []
+    for i in range(count):
+        user = {"id": str(MEMBER_BASE + i), "username": f"trainer_{i}", "discriminator": "0",
+                "global_name": f"Trainer {i}", "avatar": "a" * 32 if rng.random() < 0.7 else None}
+        members.append({"user": user, "roles": rng.sample(ROLE_IDS, rng.randint(0, 6)), "joined_at": "2023-06-01T00:00:00+00:00",
+                        "nick": None, "deaf": False, "mute": False, "flags": 0,
+                        "premium_since": "2024-01-01T00:00:00+00:00" if rng.random() < 0.02 else None})
+        status = rng.choice(["online", "idle", "dnd", "offline", "offline"])
+        if status == "offline":
+            continue
+        activities = [a for a in (activity(rng), activity(rng)) if a]
+        if rng.random() < 0.3:
+            activities.append({"type": 4, "name": "Custom Status", "state": rng.choice(["discord.gg/pokearena", "busy"]),
+                               "created_at": 1700000000000})
+        presences.append({"user": {"id": user["id"]}, "status": status, "activities": activities,
+                          "client_status": {"desktop": status}})
+    return {"id": str(GUILD_ID), "name": "Pokearena", "owner_id": str(MEMBER_BASE), "member_count": count,
+            "roles": [{"id": role_id, "name": f"role {role_id}", "permissions": "0", "position": i, "color": 0,
+                       "hoist": False, "managed": False, "mentionable": False} for i, role_id in enumerate(ROLE_IDS)],
+            "channels": [{"id": str(CHANNEL_ID), "type": 0, "name": "general", "position": 0,
+                          "permission_overwrites": []}],
+            "members": members, "presences": presences, "emojis": [], "stickers": [], "features": [],
+            "premium_tier": 3, "large": True}
+
+
+def message_payload(i, rng):
+    return {"id": str(1200000000000000000 + i), "channel_id": str(CHANNEL_ID), "guild_id": str(GUILD_ID),
+            "author": {"id": str(MEMBER_BASE + rng.randrange(1000)), "username": "trainer", "discriminator": "0", "avatar": None},
+            "content": " ".join(rng.choices(["gg", "battle", "at", "6pm", "anyone", "online", "lol"], k=12)),
+            "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False, "mention_everyone": False,
+            "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "type": 0}
+
+
+def measure(compact, count, seed):
+    rng = random.Random(seed)
+    payload = guild_payload(count, rng)
+    messages = [message_payload(i, rng) for i in range(1000)]
+    if compact:
+        client = discord.Client(**member_cache.cache_options(member_cache.compact_intents()))
+        member_cache.install(client._connection)
+    else:
+        intents = discord.Intents.default()
+        intents.presences = intents.members = intents.message_content = True
+        client = discord.Client(intents=intents)
+    state = client._connection
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    state.parsers["GUILD_CREATE"](payload)  # not awaited past the cache fill, chunking needs a gateway
+    for message in messages:
+        state.parsers["MESSAGE_CREATE"](message)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    guild = client.get_guild(GUILD_ID)
+    stats = (len(guild.members), sum(len(m.activities) for m in guild.members), len(state._messages or ()))
+    del payload, messages
+    return used, stats
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"python {sys.version.split()[0]}, discord.py {discord.__version__}, {args.members} members\n")
+    results = {}
+    for name, compact in (("default", False), ("compact", True)):
+        used, (members, activities, messages) = measure(compact, args.members, args.seed)
+        results[name] = used
+        print(f"{name:<10}{used / 1e6:>9.1f} MB{used / members:>8.0f} B/member"
+              f"{activities:>10} activities{messages:>6} cached messages")
+    print(f"\ncompact saves {(1 - results['compact'] / results['default']) * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,435 @@
+"""
+Offline replay harness for main.py and its extensions
+Feeds a synthetic (or recorded) gateway event stream into the real handlers, using fake
+guild/member/role/channel objects, and reports throughput, latency percentiles and outbound REST calls
+
+Run from the repo root:
+    python -m benchmarks.replay --events 20000 --members 2000
+    python -m benchmarks.replay --record events.jsonl    # also save the generated stream
+    python -m benchmarks.replay --replay events.jsonl    # replay a saved/recorded stream
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import types
+from collections import Counter, defaultdict
+
+import discord
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUILD_ID = 1006542206569558116
+ALLY_ROLE = 1118000000000000001
+BOOSTER_ROLE = 1118000000000000002
+BOT_ID = 1118000000000000003
+GENERAL_CHANNEL = 1118000000000000004
+MEMBER_BASE = 1119000000000000000
+CLAN_ROLES = (1102473662352863242, 1102473551195410502, 1102473472438972448)  # same ids as extensions.clan.clan_role_set
+
+_message_ids = itertools.count(1120000000000000000)
+_dm_ids = itertools.count(1121000000000000000)
+_mention = re.compile(r'<@!?([0-9]{15,20})>')
+
+
+class Rest:
+    """Counts (and optionally delays) every call that would have gone to discord"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def __call__(self, route):
+        self.calls[route] += 1
+        await asyncio.sleep(self.latency)
+
+
+rest = Rest()
+
+
+class FakeRole:
+    def __init__(self, id, name, color=discord.Color.default()):
+        self.id = id
+        self.name = name
+        self.color = color
+
+    @property
+    def mention(self):
+        return f"<@&{self.id}>"
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content="", embeds=(), guild=None):
+        self.id = next(_message_ids)
+        self.channel = channel
+        self.author = author
+        self.content = content
+        self.embeds = list(embeds)
+        self.guild = guild
+        self.mentions = []
+        self._state = bot_user._state  # commands.Context reads it
+
+    async def edit(self, *, embed=None, **kwargs):
+        await rest("PATCH /channels/:id/messages/:id")
+        if embed is not None:
+            self.embeds = [embed]
+        return self
+
+    async def add_reaction(self, emoji):
+        await rest("PUT /channels/:id/messages/:id/reactions")
+
+
+class FakeChannel:
+    def __init__(self, id, guild=None):
+        self.id = id
+        self.guild = guild
+        self.messages = []
+
+    async def send(self, content=None, *, embed=None, embeds=None, **kwargs):
+        await rest("POST /channels/:id/messages")
+        message = FakeMessage(self, bot_user, content or "", embeds or ([embed] if embed else []), self.guild)
+        self.messages.append(message)
+        return message
+
+    async def history(self, limit=100):
+        await rest("GET /channels/:id/messages")
+        for message in reversed(self.messages[-limit:]):
+            yield message
+
+    def get_partial_message(self, message_id):
+        for message in self.messages:
+            if message.id == message_id:
+                return message
+        return _DeletedMessage()
+
+
+class _DeletedMessage:
+    async def edit(self, **kwargs):
+        await rest("PATCH /channels/:id/messages/:id")
+        raise discord.NotFound(types.SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+
+
+dm_channels = {}
+
+
+class FakeMember(discord.Member):
+    """discord.Member subclass so isinstance checks (MemberConverter) still pass"""
+
+    def __init__(self, guild, id, name, role_ids=(), status="online", activities=(), bot=False):
+        self.guild = guild
+        self.activities = tuple(activities)
+        self.premium_since = None
+        self.nick = None
+        self._fake = {"id": id, "name": name, "bot": bot, "status": status, "dm": None}
+        self.role_ids = set(role_ids)
+
+    def copy(self):
+        member = FakeMember(self.guild, self.id, self.name, self.role_ids, self.raw_status, self.activities, self.bot)
+        member.premium_since = self.premium_since
+        return member
+
+    id = property(lambda self: self._fake["id"])
+    name = property(lambda self: self._fake["name"])
+    display_name = name
+    bot = property(lambda self: self._fake["bot"])
+    raw_status = property(lambda self: self._fake["status"])
+    dm_channel = property(lambda self: self._fake["dm"])
+    mention = property(lambda self: f"<@{self.id}>")
+    avatar = None
+    display_avatar = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+    @property
+    def roles(self):
+        return [self.guild.get_role(role_id) for role_id in self.role_ids]
+
+    def get_role(self, role_id):
+        return self.guild.get_role(role_id) if role_id in self.role_ids else None
+
+    async def add_roles(self, *roles, **kwargs):
+        for role in roles:
+            await rest("PUT /guilds/:id/members/:id/roles/:id")
+            self.role_ids.add(role.id)
+
+    async def remove_roles(self, *roles, **kwargs):
+        for role in roles:
+            await rest("DELETE /guilds/:id/members/:id/roles/:id")
+            self.role_ids.discard(role.id)
+
+    async def create_dm(self):
+        await rest("POST /users/@me/channels")
+        channel = FakeChannel(next(_dm_ids))
+        dm_channels[channel.id] = channel
+        self._fake["dm"] = channel
+        return channel
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"<FakeMember id={self.id} name={self.name!r}>"
+
+    def __hash__(self):
+        return self.id >> 22
+
+
+class FakeGuild:
+    def __init__(self, id):
+        self.id = id
+        self.premium_tier = 3
+        self.premium_subscription_count = 0
+        self._members = {}
+        self._roles = {}
+        self._channels = {}
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    @property
+    def premium_subscriber_role(self):
+        return self._roles.get(BOOSTER_ROLE)
+
+    @property
+    def premium_subscribers(self):
+        return [member for member in self._members.values() if member.premium_since]
+
+    def get_member(self, member_id):
+        return self._members.get(member_id)
+
+    def get_member_named(self, name):
+        return next((member for member in self._members.values() if member.name == name), None)
+
+    def get_role(self, role_id):
+        return self._roles.get(role_id)
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+
+bot_user = None
+
+CHAT = ["gg", "anyone up for a battle?", "lol that was close", "who is online", "nice team!", "brb",
+        "the new event looks great", "i need a water type", "ok", "what's the meta right now"]
+TIMES = ["lets battle at 6pm", "does 11am suit you?", "meet at 7:30 pm tomorrow", "tourney starts by 9 pm",
+         "i'm free after 10", "8:15pm for {mention}", "3am for {mention} is late", "see you at 12 am"]
+NUMBERS = ["i caught 3 shinies", "level 100 finally", "2v2 anyone", "won 5 in a row"]
+VANITY = ["discord.gg/pokearena", "join .gg/pokearena !!", "pokearena.xyz", "play at https://pokearena.xyz now"]
+STATUSES = ["grinding", "😴", "busy", "ask me for trades", "pokemon!"]
+GAMES = ["Pokéarena", "Minecraft", "Valorant", None]
+
+
+def load_main(workdir):
+    """Imports main.py against a throwaway working directory and fake config"""
+    os.chdir(workdir)
+    config = types.ModuleType("dotenv")
+    config.GUILD_ID, config.ALLY_role, config.TOKEN = GUILD_ID, ALLY_ROLE, "offline"
+    sys.modules["dotenv"] = config
+    sys.path.insert(0, REPO)
+    import main
+    return main
+
+
+def extension(main, name):
+    """A loaded feature extension's module, e.g. extension(main, "vanity")"""
+    return main.bot.extensions[f"extensions.{name}"]
+
+
+async def fire(main, name, *args):
+    """Runs the bot's own handler and every extension listener of an event, to completion unlike bot.dispatch"""
+    handler = main.bot.__dict__.get(name)  # set by @bot.event, the class' default on_message is not ours
+    if handler is not None:
+        await handler(*args)
+    for listener in main.bot.extra_events.get(name, ()):
+        await listener(*args)
+
+
+def build_guild(main, member_count, rng):
+    clan, timezone = extension(main, "clan"), extension(main, "timezone")
+    global bot_user
+    bot_user = discord.ClientUser(state=main.bot._connection, data={
+        "id": BOT_ID, "username": "Raichu", "discriminator": "0", "avatar": None, "bot": True})
+    main.bot._connection.user = bot_user
+
+    guild = FakeGuild(GUILD_ID)
+    guild._roles[ALLY_ROLE] = FakeRole(ALLY_ROLE, "Ally", discord.Color.gold())
+    guild._roles[BOOSTER_ROLE] = FakeRole(BOOSTER_ROLE, "Booster", discord.Color.pink())
+    for role_id, name in zip(sorted(clan.clan_role_set), ("Team Void", "Team Immortal", "Team Infinity")):
+        guild._roles[role_id] = FakeRole(role_id, name, discord.Color.red())
+        guild._channels[clan.clan_channels[role_id]] = FakeChannel(clan.clan_channels[role_id], guild)
+    guild._channels[GENERAL_CHANNEL] = FakeChannel(GENERAL_CHANNEL, guild)
+
+    zones = list(timezone.timezones)
+    for i in range(member_count):
+        member_id = MEMBER_BASE + i
+        roles = set()
+        if rng.random() < 0.3:
+            roles.add(rng.choice(sorted(clan.clan_role_set)))
+        activities = []
+        if rng.random() < 0.05:
+            activities.append(discord.CustomActivity(name=rng.choice(VANITY)))
+            roles.add(ALLY_ROLE)
+        status = rng.choice(["online", "online", "idle", "dnd", "offline"])
+        member = FakeMember(guild, member_id, f"trainer_{i}", roles, status, activities, bot=i % 97 == 0)
+        if rng.random() < 0.02:
+            member.premium_since = discord.utils.utcnow()
+            member.role_ids.add(BOOSTER_ROLE)
+            guild.premium_subscription_count += 1
+        guild._members[member_id] = member
+        if rng.random() < 0.4:
+            timezone.data[str(member_id)] = {"timezone": rng.choice(zones), "enabled": rng.random() < 0.8}
+
+    main.bot.get_guild = lambda guild_id: guild if guild_id == GUILD_ID else None
+    main.bot.get_partial_messageable = lambda channel_id, **kwargs: dm_channels.get(channel_id) or FakeChannel(channel_id)
+    return guild
+
+
+def synthetic_events(member_count, count, rng):
+    """A chat/presence heavy stream: ~55% presence, ~35% messages, ~10% member updates"""
+    for _ in range(count):
+        member_id = MEMBER_BASE + rng.randrange(member_count)
+        roll = rng.random()
+        if roll < 0.55:
+            custom = None
+            kind = rng.random()
+            if kind < 0.15:
+                custom = rng.choice(VANITY)
+            elif kind < 0.4:
+                custom = rng.choice(STATUSES)
+            yield {"type": "presence", "member": member_id, "status": rng.choice(["online", "online", "idle", "offline"]),
+                   "custom": custom, "game": rng.choice(GAMES)}
+        elif roll < 0.9:
+            kind = rng.random()
+            if kind < 0.6:
+                content = rng.choice(CHAT)
+            elif kind < 0.8:
+                content = rng.choice(NUMBERS)
+            else:
+                content = rng.choice(TIMES).format(mention=f"<@{MEMBER_BASE + rng.randrange(member_count)}>")
+            yield {"type": "message", "member": member_id, "channel": GENERAL_CHANNEL, "content": content}
+        else:
+            yield {"type": "member_update", "member": member_id, "add_roles": [rng.choice(CLAN_ROLES)], "remove_roles": []}
+
+
+async def dispatch(main, guild, event):
+    member = guild.get_member(event["member"])
+    if member is None:
+        return
+    if event["type"] == "message":
+        message = FakeMessage(guild.get_channel(event["channel"]), member, event["content"], guild=guild)
+        message.mentions = [m for m in map(guild.get_member, map(int, _mention.findall(message.content))) if m]
+        await fire(main, "on_message", message)
+    elif event["type"] == "presence":
+        before = member.copy()
+        member._fake["status"] = event["status"]
+        activities = []
+        if event.get("custom"):
+            activities.append(discord.CustomActivity(name=event["custom"]))
+        if event.get("game"):
+            activities.append(discord.Game(name=event["game"]))
+        member.activities = tuple(activities)
+        await fire(main, "on_presence_update", before, member)
+    elif event["type"] == "member_update":
+        before = member.copy()
+        member.role_ids.update(event.get("add_roles", ()))
+        member.role_ids.difference_update(event.get("remove_roles", ()))
+        await fire(main, "on_member_update", before, member)
+
+
+async def drain(main):
+    """Waits for work the handlers pushed to background queues"""
+    vanity = extension(main, "vanity")
+    queue, changes, replies = vanity.presence_queue, vanity.role_changes, extension(main, "timezone").replies
+    while (queue._pending or queue._active or not queue._queue.empty()
+           or len(changes) or changes._timer.running or replies.busy):
+        await asyncio.sleep(0.001)
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def replay(main, members, rng, events, settle):
+    await main.setup_hook()
+    guild = build_guild(main, members, rng)
+    vanity = extension(main, "vanity")
+    vanity.presence_queue.settle = settle
+    vanity.vanity_scheduler.interval = 0  # nothing to rate limit against offline
+    vanity.role_changes.scheduler.interval = 0
+    vanity.role_changes.delay = settle
+    extension(main, "timezone").replies.window = settle
+    await fire(main, "on_ready")
+    await asyncio.sleep(0)
+    while vanity.vanity_reconciling:  # startup reconciliation, not part of the measured run
+        await asyncio.sleep(0.01)
+    rest.calls.clear()
+
+    latencies = defaultdict(list)
+    start = time.perf_counter()
+    for event in events:
+        begin = time.perf_counter()
+        await dispatch(main, guild, event)
+        latencies[event["type"]].append(time.perf_counter() - begin)
+    handled = time.perf_counter() - start
+    await drain(main)
+    return latencies, handled, time.perf_counter() - start
+
+
+def report(latencies, handled, total, main):
+    count = sum(len(values) for values in latencies.values())
+    print(f"replayed {count} events: handlers {handled:.2f}s ({count / handled:,.0f} events/s), "
+          f"incl. background work {total:.2f}s ({count / total:,.0f} events/s)\n")
+    print(f"{'event':<16}{'count':>8}{'p50 µs':>10}{'p95 µs':>10}{'p99 µs':>10}{'max µs':>10}")
+    for kind, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{kind:<16}{len(values):>8}" + "".join(
+            f"{percentile(values, q) * 1e6:>10.0f}" for q in (0.5, 0.95, 0.99)) + f"{values[-1] * 1e6:>10.0f}")
+    print(f"\nREST calls: {sum(rest.calls.values())} ({sum(rest.calls.values()) / count:.3f} per event)")
+    for route, calls in rest.calls.most_common():
+        print(f"  {calls:>7}  {route}")
+    vanity = extension(main, "vanity")
+    queue = vanity.presence_queue
+    print(f"\npresence queue: {queue.received} received, {queue.dropped} dropped, {queue.processed} processed")
+    changes = vanity.role_changes
+    print(f"role changes: {changes.queued} queued, {changes.cancelled} cancelled out, {changes.sent} sent")
+    replies = extension(main, "timezone").replies
+    print(f"time replies: {replies.received} conversions, {replies.duplicates} repeats dropped, {replies.sent} messages sent")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--settle", type=float, default=0.05, help="presence settle and reply batching window in seconds")
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="simulated REST latency in ms")
+    parser.add_argument("--record", help="write the generated stream to this jsonl file")
+    parser.add_argument("--replay", help="replay a jsonl stream instead of generating one")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rest.latency = args.rest_latency / 1000
+    if args.replay:
+        with open(args.replay) as fp:
+            events = [json.loads(line) for line in fp if line.strip()]
+        members = max(event["member"] for event in events) - MEMBER_BASE + 1
+    else:
+        members = args.members
+        events = list(synthetic_events(members, args.events, rng))
+    if args.record:
+        with open(args.record, "w") as fp:
+            fp.writelines(json.dumps(event) + "\n" for event in events)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        main = load_main(workdir)
+        latencies, handled, total = asyncio.run(replay(main, members, rng, events, args.settle))
+        report(latencies, handled, total, main)
+        main.core.db.close()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,74 @@
+"""
+Cold start: importing main.py and loading the feature extensions, each run in a fresh interpreter
+"cold" has no zone offset cache on disk (first start, or the tz database was updated), "warm" reuses it
+Run from the repo root: python -m benchmarks.startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ("discord", "main", "extensions")
+
+
+def child(workdir):
+    """Runs in the fresh interpreter, prints the phase timings as the last line"""
+    start = time.perf_counter()
+    import asyncio
+    import importlib
+    import types
+    importlib.import_module("discord")  # timed on its own, every start pays for it
+    timings = {"discord": time.perf_counter() - start}
+
+    os.chdir(workdir)
+    config = types.ModuleType("dotenv")
+    config.GUILD_ID, config.ALLY_role, config.TOKEN = 1, 2, "offline"
+    sys.modules["dotenv"] = config
+    sys.path.insert(0, REPO)
+    start = time.perf_counter()
+    import main
+    timings["main"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(main.setup_hook())
+    timings["extensions"] = time.perf_counter() - start
+    assert len(main.bot.extensions) == len(main.core.EXTENSIONS)
+    main.core.db.close()
+    print(json.dumps(timings))
+
+
+def run(workdir):
+    out = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--child", workdir], cwd=REPO,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    print(f"{'':<8}" + "".join(f"{phase + ' ms':>16}" for phase in PHASES) + f"{'total ms':>12}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in ("cold", "warm"):
+            results = []
+            for _ in range(args.runs):
+                if name == "cold":
+                    for file in os.listdir(workdir):
+                        os.remove(os.path.join(workdir, file))
+                results.append(run(workdir))
+            medians = {phase: statistics.median(result[phase] for result in results) * 1000 for phase in PHASES}
+            print(f"{name:<8}" + "".join(f"{medians[phase]:>16.1f}" for phase in PHASES)
+                  + f"{sum(medians.values()):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
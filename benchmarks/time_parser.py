@@ -0,0 +1,114 @@
+"""
+Time detection throughput: tokenizer parser (utils.timeparse) vs the old time_regex pipeline
+Run from the repo root: python -m benchmarks.time_parser [--messages 100000]
+"""
+import argparse
+import random
+import re
+import time
+
+from utils.timeparse import parse_times
+
+# the regex main.py used before utils.timeparse, with its prefilter and lone-hour filter
+time_regex = re.compile(
+    r'(?:^|\s)'
+    r'(at|by|till|before|after)?'
+    r'\s{0,3}(1[0-2]|0?[1-9])'
+    r'\s{0,3}(?::\s{0,3}([0-5][0-9]))?'
+    r'\s{0,3}(?:(am|pm).?)?'
+    r'\s{0,2}(yesterday|tomorrow|day\s{0,3}after\s{0,3}tomorrow|day\s{0,3}before\s{0,3}yesterday)?'
+    r'\s{0,3}(?:for\s{0,3}(<@!?[0-9]+>|[0-9]+|[a-z._]+))?'
+    r'(?:\s|\?|\.|$)',
+    re.IGNORECASE
+)
+digit_regex = re.compile(r'\d')
+
+
+def regex_pipeline(content):
+    matches = time_regex.findall(content) if digit_regex.search(content) else []
+    return [match for match in matches if match[0] or any(match[2:-1])][:3]
+
+
+WORDS = ("the battle was close gg team water fire trade shiny legendary raid event anyone online "
+         "lol nice meta grind level catch evolve tourney clan join queue ranked").split()
+TIMES = ["at 6pm", "11am", "7:30 pm tomorrow", "by 9 pm", "after 10", "8:15pm for <@123456789012345678>",
+         "3am for intenzi", "12 am", "from 5-7pm", "at noon", "18:30", "on friday at 5pm"]
+NUMBERS = ["3 shinies", "level 100", "2v2", "5 in a row", "won 2-3", "gen 4", "top 10"]
+
+
+# grammar regression cases: message -> (hour, minute, day offset) of the first time found, None for no time
+GRAMMAR = {
+    "at 6pm": (18, 0, 0), "11am": (11, 0, 0), "7:30 pm tomorrow": (19, 30, 1), "by 9 pm": (21, 0, 0),
+    "after 10": (22, 0, 0), "8:15pm for <@123456789012345678>": (20, 15, 0), "12 am": (0, 0, 0),
+    "from 5-7pm": (17, 0, 0), "at noon, ok": (12, 0, 0), "18:30": (18, 30, 0), "5 tomorrow": (17, 0, 1),
+    "tomorrow at 6": (18, 0, 1), "the day after tomorrow at 6": (18, 0, 2), "at 9 tonight": (21, 0, 0),
+    "see you at 5.": (17, 0, 0), "meet at 6!": (18, 0, 0), "at 6pm, ok": (18, 0, 0), "(at 6pm)": (18, 0, 0),
+    # today and weekdays don't make a lone number a time, and a clock has to stand apart from the text around it
+    "I am 12 today": None, "i have 3 today": None, "gen 4 on friday": None, "on monday 3 wins": None,
+    "next friday 2": None, "9/11 tomorrow": None, "at 10% hp": None, "at 5, then": None,
+    "level 100": None, "2v2": None, "won 2-3": None, "top 10": None, "5 in a row": None,
+}
+
+
+def check_grammar():
+    wrong = {}
+    for message, expected in GRAMMAR.items():
+        mentions = parse_times(message)
+        found = (*mentions[0].start.candidates()[0], mentions[0].day_offset) if mentions else None
+        if found != expected:
+            wrong[message] = found
+    assert not wrong, wrong
+
+
+def corpus(count, rng):
+    messages = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(2, 14))
+        roll = rng.random()
+        if roll < 0.15:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(TIMES))
+        elif roll < 0.35:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(NUMBERS))
+        elif roll < 0.37:  # long pastes full of numbers
+            words = [str(rng.randint(1, 12)) + rng.choice(["", ":30", " ", "  "]) for _ in range(200)]
+        messages.append(" ".join(words))
+    return messages
+
+
+def bench(name, func, messages, repeat=3):
+    best = float("inf")
+    found = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = sum(len(func(message)) for message in messages)
+        best = min(best, time.perf_counter() - start)
+    size = sum(map(len, messages)) / 1e6
+    print(f"{name:<14}{len(messages) / best:>14,.0f} msg/s{size / best:>10.1f} MB/s{found:>10} times found")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    check_grammar()
+    messages = corpus(args.messages, random.Random(args.seed))
+    print(f"{len(messages)} messages, {sum(map(len, messages)) / 1e6:.1f} MB\n")
+    old = bench("time_regex", regex_pipeline, messages)
+    new = bench("timeparse", parse_times, messages)
+    print(f"\nspeedup x{old / new:.2f}")
+
+    # worst case for the regex: many numbers separated by short whitespace runs
+    # worst case for the prefilters: every few characters looks like a time but none is (only real ones count to the limit)
+    worst = {"number spam": "at " + "1  " * 20_000, "false alarm spam": "at 1x " * 2800}
+    for label, text in worst.items():
+        for name, func in (("time_regex", regex_pipeline), ("timeparse", parse_times)):
+            start = time.perf_counter()
+            func(text)
+            print(f"{name:<14}{(time.perf_counter() - start) * 1000:>10.2f} ms on a {len(text) / 1000:.1f}k char {label}")
+
+
+if __name__ == "__main__":
+    main()
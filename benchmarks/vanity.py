@@ -0,0 +1,83 @@
+"""
+Vanity status matching: the old two-findall contains_vanity vs main.py's single combined matcher
+Run from the repo root: python -m benchmarks.vanity [--statuses 100000]
+"""
+import argparse
+import random
+import re
+import time
+
+# the patterns main.py used before the combined matcher
+site_regex = re.compile(r'((?:^| )(?:http://|https://|)(?:www\.|)pokearena.xyz(?: |$))')
+vanity_regex = re.compile(r'((?:^| )(?:\.gg|discord\.gg)/pokearena(?: |$))')
+
+site_pattern = r'(?:http://|https://|)(?:www\.|)pokearena.xyz'
+vanity_pattern = r'(?:\.gg|discord\.gg)/pokearena'
+combined = re.compile(rf'(?:^| )(?:{site_pattern}|{vanity_pattern})(?: |$)')
+
+
+class Guild:
+    premium_tier = 3
+
+
+guilds = {1: Guild()}
+
+
+def old_contains_vanity(status):
+    guild = guilds.get(1)  # bot.get_guild(GUILD_ID)
+    if guild.premium_tier == 3:
+        return vanity_regex.findall(status) or site_regex.findall(status)
+    return site_regex.findall(status)
+
+
+def new_contains_vanity(status):
+    return "pokearena" in status and combined.search(status) is not None
+
+
+PLAIN = ["grinding ranked", "😴", "busy", "ask me for trades", "pokemon!", "shiny hunting 🌟", "dnd", "AFK",
+         "gym leader of the water type", "trading legendaries, dm me", "https://twitch.tv/someone",
+         "join discord.gg/otherserver", "level 100 charizard ✨", "🎵 listening to music", "in a tourney"]
+VANITY = ["discord.gg/pokearena", "join .gg/pokearena !!", "pokearena.xyz", "play at https://pokearena.xyz now",
+          "⚡ discord.gg/pokearena ⚡", "www.pokearena.xyz best battles"]
+
+
+def corpus(count, rng):
+    # most custom statuses have nothing to do with the server, and long ones exist
+    statuses = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.1:
+            statuses.append(rng.choice(VANITY))
+        elif roll < 0.15:
+            statuses.append(" ".join(rng.choices(PLAIN, k=8)) + " " + rng.choice(VANITY))
+        else:
+            statuses.append(" ".join(rng.choices(PLAIN, k=rng.randint(1, 3))))
+    return statuses
+
+
+def bench(name, func, statuses, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = sum(1 for status in statuses if func(status))
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<12}{best / len(statuses) * 1e9:>8.0f} ns/status{found:>10} matched")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statuses", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    statuses = corpus(args.statuses, random.Random(args.seed))
+    mismatched = [status for status in statuses if bool(old_contains_vanity(status)) != new_contains_vanity(status)]
+    assert not mismatched, mismatched[:5]
+    old = bench("two findall", old_contains_vanity, statuses)
+    new = bench("combined", new_contains_vanity, statuses)
+    print(f"\nspeedup x{old / new:.2f}")
+
+
+if __name__ == "__main__":
+    main()
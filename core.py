@@ -0,0 +1,92 @@
+"""
+What every feature extension shares: the bot, metrics, config, the database and the page buttons
+Importing this has no side effects beyond building the (unconnected) bot, the database is opened by setup_hook
+"""
+import discord
+from discord.ext import commands
+from discord.ui import View
+
+from utils import member_cache
+from utils.metrics import Metrics
+from utils.storage import Store
+
+# only cache the member fields the bot reads (roles, boost, offline, custom status), see utils/member_cache.py
+COMPACT_CACHE = True
+
+if COMPACT_CACHE:
+    cache_kwargs = member_cache.cache_options(member_cache.compact_intents())
+else:
+    intents = discord.Intents.default()
+    intents.typing = False
+    intents.presences = True
+    intents.members = True
+    intents.message_content = True
+    cache_kwargs = {"intents": intents}
+
+metrics = Metrics()
+METRICS_FILE = "metrics.prom"  # prometheus textfile, rewritten every minute
+
+bot = commands.Bot(command_prefix=commands.when_mentioned_or("%"), strip_after_prefix=True, case_insensitive=True,
+                   http_trace=metrics.rest_trace(), **cache_kwargs)
+if COMPACT_CACHE:
+    member_cache.install(bot._connection)
+metrics.count_gateway_events(bot._connection)
+bot.activity = discord.Activity(type=discord.ActivityType.playing, name="🌊Sugar Surf!🌸")
+
+# feature extensions, loaded in this order by setup_hook
+EXTENSIONS = ("extensions.clan", "extensions.vanity", "extensions.timezone", "extensions.misc")
+
+
+# in-memory db, persisted to sqlite by a write-behind store
+db = None
+
+
+def open_db(path="database.db"):
+    """The shared Store, opened on first call, extensions call this for their tables"""
+    global db
+    if db is None:
+        db = Store(path, on_flush=lambda seconds: metrics.observe("db_flush_seconds", seconds))
+    return db
+
+
+def listen(*listeners):
+    """
+    Adds an extension's event handlers, named after the event they handle, with latency and throughput metrics
+    Several extensions can handle the same event, so the metrics are labelled `extension.on_event`
+    """
+    for listener in listeners:
+        name = f"{listener.__module__.rpartition('.')[2]}.{listener.__name__}"
+        bot.add_listener(metrics.instrument("event", listener, name=name), listener.__name__)
+
+
+# async callables(ctx) run on every non-bot message before its command is invoked, extensions add theirs on load
+message_hooks = []
+
+
+class Paginator(View):
+    """◀️ Page ▶️ buttons, each page is rendered only when it is shown"""
+
+    def __init__(self, render, page_count):
+        self.render = render  # page index -> Embed
+        self.page_count = page_count  # callable, the number of pages can change while the view is open
+        self.current_page = 0
+        super().__init__(timeout=120)
+        self.children[1].label = f"Page 1/{page_count()}"
+
+    async def show(self, interaction, page):
+        pages = self.page_count()
+        self.current_page = page % pages  # wraps around both ways
+        self.children[1].label = f"Page {self.current_page + 1} / {pages}"
+        await interaction.response.edit_message(view=self, embed=self.render(self.current_page))
+
+    @discord.ui.button(emoji="◀️")
+    async def left_button(self, interaction, btn):
+        await self.show(interaction, self.current_page - 1)
+
+    @discord.ui.button(label="Page 1/1", style=discord.ButtonStyle.blurple, disabled=True)
+    async def page_label_button(self, interaction, btn):
+        """This button is a display-only button to show Pages"""
+
+    @discord.ui.button(emoji="▶️")
+    async def right_button(self, interaction, btn):
+        await self.show(interaction, self.current_page + 1)
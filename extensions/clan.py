@@ -0,0 +1,73 @@
+import random
+
+import discord
+
+import core
+from core import bot, metrics
+from dotenv import GUILD_ID
+from utils.role_index import RoleIndex
+
+INFINITY_role = 1102473662352863242
+IMMORTAL_role = 1102473551195410502
+VOID_role = 1102473472438972448
+
+
+clan_role_set = {INFINITY_role, IMMORTAL_role, VOID_role}
+clan_channels = {INFINITY_role: 1123818520002711622, IMMORTAL_role: 1123815087350763520, VOID_role: 1123814492309041253}
+clan_emotes = {INFINITY_role: "<a:infinity:1118053955314921472>",  IMMORTAL_role: "<a:immortal:1118053951791697930>", VOID_role: "<a:void:1118053970913538068>"}
+clan_welcome_texts = ["Hey hey {mention}!! ⚡", "🤺 Engarde!! {mention}", "⚔️{mention} barged in.."]
+
+# members of each clan role, saves walking the whole member cache for counts
+role_index = RoleIndex()
+
+
+async def on_ready():
+    # fires again on every reconnect that could not resume, so the index is rebuilt from a fresh cache
+    guild = bot.get_guild(GUILD_ID)
+    if guild is not None:
+        role_index.rebuild(guild, clan_role_set)
+
+
+# Clan Welcome Feature
+@metrics.timed("task")
+async def clan_welcome(member, clan_role_id):
+    clan_role = member.guild.get_role(clan_role_id)
+    member_count = role_index.count(clan_role_id)
+    emb = discord.Embed(color=clan_role.color, title="🔔 New Clan Member")
+    emb.description = f"A new member has joined our {clan_role.mention}!\nDo welcome {member.display_name} aboard!"
+    emb.set_footer(
+        text=f"{clan_role.name[5:]} now has {member_count} members.")  # skips out 'Team '  from Team Infinity, Team Immortal and Team Void
+    emb.set_image(url=member.avatar)
+    clan_channel = member.guild.get_channel(clan_channels[clan_role.id])
+    m = await clan_channel.send(content=random.choice(clan_welcome_texts).format(mention=member.mention), embed=emb)
+    await m.add_reaction(clan_emotes[clan_role.id])
+
+
+async def on_member_update(before_m, after_m):
+    """Clan join notification"""
+    if after_m.guild.id == GUILD_ID and before_m.roles != after_m.roles:
+        role_index.update_member(after_m)
+    if after_m.bot:
+        return
+
+    before = {role.id for role in before_m.roles}
+    if clan_role_set.intersection(before):
+        return
+    after = {role.id for role in after_m.roles}
+    clan_role = clan_role_set.intersection(after)
+    if clan_role:
+        await clan_welcome(after_m, clan_role.pop())
+
+
+async def on_member_join(member):
+    if member.guild.id == GUILD_ID:
+        role_index.add_member(member)
+
+
+async def on_member_remove(member):
+    if member.guild.id == GUILD_ID:
+        role_index.remove_member(member.id)
+
+
+async def setup(bot):
+    core.listen(on_ready, on_member_update, on_member_join, on_member_remove)
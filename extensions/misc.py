@@ -0,0 +1,116 @@
+import functools
+import random
+import time
+
+import discord
+from discord.ext import commands
+
+import core
+from core import Paginator, bot, metrics
+from dotenv import GUILD_ID
+from utils.roster import Roster
+
+
+def booster_line(member):
+    return f"- **{member}** ({member.mention})"
+
+
+# main guild's boosters, longest boosting first, kept current by member updates
+booster_roster = Roster(booster_line)
+
+
+def build_booster_roster(guild, roster=booster_roster):
+    roster.rebuild(sorted(guild.premium_subscribers, key=lambda member: member.premium_since))
+    return roster
+
+
+@commands.command(name="metrics")
+@commands.is_owner()
+async def metrics_(ctx):
+    """Busiest handlers and REST routes since startup"""
+    lines = [f"{'handler':<28}{'calls':>8}{'mean ms':>10}{'p95 ms':>9}"]
+    for labels, count, mean, p95 in metrics.summary("handler_seconds")[:15]:
+        lines.append(f"{labels['handler'][:27]:<28}{count:>8}{mean * 1000:>10.1f}{p95 * 1000:>9.1f}")
+    lines.append(f"\n{'route':<28}{'calls':>8}{'mean ms':>10}{'p95 ms':>9}")
+    for labels, count, mean, p95 in metrics.summary("rest_seconds")[:10]:
+        route = f"{labels['method']} {labels['route']}"
+        lines.append(f"{route[:27]:<28}{count:>8}{mean * 1000:>10.1f}{p95 * 1000:>9.1f}")
+    uptime = time.time() - metrics.started
+    events = sum(v for (name, _), v in metrics.counters.items() if name == "raichu_gateway_events_total")
+    lines.append(f"\n{events} gateway events in {uptime / 60:.0f} min ({events / uptime:.1f}/s)")
+    await ctx.send("```\n" + "\n".join(lines)[:1900] + "\n```")
+
+
+@commands.command()
+@commands.is_owner()
+async def sync(ctx):
+    await bot.tree.sync()
+    await ctx.send('Successfully synced!')
+
+
+@commands.hybrid_command(aliases=('flip', ))
+@commands.cooldown(1, 2.0, commands.BucketType.user)
+async def coinflip(ctx):
+    """%flip, a simple coin flip"""
+    await ctx.send(f"{ctx.author.mention} {random.choice(['heads', 'tails', 'heads', 'tails'])}", allowed_mentions=discord.AllowedMentions(users=False))  # for no particular reason
+
+
+@commands.hybrid_command(aliases=('boost', ))
+@commands.guild_only()
+@commands.cooldown(1, 3.0, commands.BucketType.channel)
+async def boosters(ctx):
+    """
+    %boost, info of boosters
+    """
+    if not ctx.guild.premium_subscription_count:
+        emb = discord.Embed(color=discord.Color.pink(), title="❤️‍🔥 Arena Boosters")
+        emb.description = f"Boost now to support Pokearena Official and gain {ctx.guild.premium_subscriber_role.mention} role!"
+        return await ctx.send(embed=emb)
+
+    roster = booster_roster
+    if ctx.guild.id != GUILD_ID or not roster.ready:  # only the main guild's roster is kept around
+        roster = build_booster_roster(ctx.guild, Roster(booster_line))
+    render = functools.partial(booster_page_embed, ctx.guild, roster)
+    view = Paginator(render, lambda: roster.page_count) if roster.page_count > 1 else None
+    await ctx.send(embed=render(0), view=view)
+
+
+def booster_page_embed(guild, roster, page):
+    emb = discord.Embed(color=discord.Color.pink())
+    emb.title = f"❤️‍🔥 {len(roster)} Arena Boosters | Level {guild.premium_tier} ({guild.premium_subscription_count} boosts) "
+    emb.description = f"<:like:1118127706928857149> Thankful to all {guild.premium_subscriber_role.mention} of arena!\n{roster.page(page)}"
+    return emb
+
+
+async def on_ready():
+    guild = bot.get_guild(GUILD_ID)
+    if guild is not None:
+        build_booster_roster(guild)
+
+
+async def on_member_update(before_m, after_m):
+    if after_m.guild.id == GUILD_ID and before_m.premium_since != after_m.premium_since:  # started or stopped boosting
+        if after_m.premium_since:
+            booster_roster.update(after_m)
+        else:
+            booster_roster.discard(after_m.id)
+
+
+async def on_user_update(before_u, after_u):
+    # roster lines show the username
+    if after_u.id in booster_roster and str(before_u) != str(after_u):
+        guild = bot.get_guild(GUILD_ID)
+        member = guild and guild.get_member(after_u.id)
+        if member is not None:
+            booster_roster.update(member)
+
+
+async def on_member_remove(member):
+    if member.guild.id == GUILD_ID:
+        booster_roster.discard(member.id)
+
+
+async def setup(bot):
+    core.listen(on_ready, on_member_update, on_user_update, on_member_remove)
+    for command in (metrics_, sync, coinflip, boosters):
+        bot.add_command(command)
@@ -0,0 +1,327 @@
+import asyncio
+import time
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+from discord.ui import View
+
+import core
+from core import Paginator, metrics
+from utils.member_lookup import MemberLookup
+from utils.replies import ReplyBatcher
+from utils.timeparse import parse_times, resolve as resolve_time
+from utils.timezones import TimezoneCatalogue, TimezoneSearch, format_offset, load_offset_table, wall_clock
+
+# utc offsets and dst transitions of every zone, for sorting the list and converting one time for many people
+# saved to disk and only rebuilt when the tz database is updated (or the saved year runs out)
+ZONE_CACHE = "zone_offsets.json"
+offset_table = load_offset_table(ZONE_CACHE)
+
+# Timezones sorted by utc offset, page lines are cached per minute
+timezones = TimezoneCatalogue(offset_table)
+tz_search = None  # autocomplete index, built on the first autocomplete
+
+
+def tz_page_embed(page):
+    return discord.Embed(color=discord.Color.gold(), title="Available Timezones", description=timezones.page(page))
+
+
+# users table
+"""
+{
+    "user_id": {"timezone": "tz", "enabled": true/false]
+}
+"""
+db = core.open_db()
+data = db.table("users", legacy_json="database.json")  # imports the old database.json on first run
+
+
+user_zones = {}  # user id -> ZoneInfo, None when they have no timezone or turned conversion off
+
+
+def update_db(user_id):
+    """Mark a user's entry as changed, it gets flushed to disk shortly after"""
+    user_zones.pop(int(user_id), None)
+    db.mark_dirty("users", user_id)
+
+
+def user_zone(user_id):
+    """ZoneInfo for converting a user's times, None if they have not set one up"""
+    if user_id not in user_zones:
+        entry = data.get(str(user_id))
+        enabled = entry and entry['enabled'] and entry['timezone']
+        user_zones[user_id] = timezones.zone(entry['timezone']) if enabled else None
+    return user_zones[user_id]
+
+
+class AllTimezonePaginator(Paginator):
+    def __init__(self):
+        super().__init__(tz_page_embed, lambda: timezones.page_count)
+
+
+# `for <user>` text -> member, names are only searched for once
+member_lookup = MemberLookup()
+
+
+async def resolve_mention(context, user_mentioned):
+    """Member for a `for <user>` mention, None if nothing was mentioned or they could not be found"""
+    if not user_mentioned:
+        return None
+    return await member_lookup.resolve(context, user_mentioned)
+
+
+def parse_time_to_tz(message, mention, mentioned, embeds, embed_order):
+    if mention.target:  # for user
+        if mentioned is None:
+            return
+        member = mentioned
+        tz = user_zone(member.id)
+        if tz is None:  # they need have a timezone
+            return
+        if member.id not in embed_order:
+            embeds[len(embed_order)].set_author(name=f"{member.name}'s time", icon_url=member.display_avatar)
+            embed_order.append(member.id)
+    else:
+        member = message.author
+        tz = user_zone(member.id)
+        if member.id not in embed_order:
+            embeds[len(embed_order)].set_author(name=member.name, icon_url=member.display_avatar)
+            embed_order.append(member.id)
+        if tz is None:
+            return
+
+    # ambiguous 12h times come back as both the pm and am reading
+    add_time_to_embed(resolve_time(mention, datetime.now(tz)), embeds, embed_order, member)
+
+
+def clock_label(t):
+    return t.strftime("%I:%M %p") if t.minute else t.strftime("%I %p")
+
+
+def add_time_to_embed(times, embeds, embed_order, member):
+    for start, end in times:
+        if end is None:
+            line = f'- {clock_label(start)} -> {discord.utils.format_dt(start, "F")} ({discord.utils.format_dt(start, "R")}) your time\n'
+        else:
+            line = f'- {clock_label(start)} - {clock_label(end)} -> {discord.utils.format_dt(start, "F")} - {discord.utils.format_dt(end, "t")} ({discord.utils.format_dt(start, "R")}) your time\n'
+        embeds[embed_order.index(member.id)].description += line
+
+
+ACTIVE_WINDOW = 30 * 60  # seconds since their last message for someone to count as "here"
+ACTIVE_PER_CHANNEL = 200  # most recent authors remembered per channel
+recent_authors = {}  # channel id -> {author id: monotonic time of their last message}, oldest first
+
+
+def note_author(message):
+    authors = recent_authors.setdefault(message.channel.id, {})
+    authors.pop(message.author.id, None)  # re-inserted at the newest end
+    authors[message.author.id] = time.monotonic()
+    if len(authors) > ACTIVE_PER_CHANNEL:
+        authors.pop(next(iter(authors)))
+
+
+def active_authors(channel_id):
+    """Ids of everyone who spoke in a channel within ACTIVE_WINDOW"""
+    authors = recent_authors.get(channel_id, {})
+    cutoff = time.monotonic() - ACTIVE_WINDOW
+    while authors and next(iter(authors.values())) < cutoff:  # oldest first, so stale entries are at the front
+        authors.pop(next(iter(authors)))
+    return list(authors)
+
+
+# replies to messages close together in a channel go out as one message, with repeated conversions dropped
+REPLY_WINDOW = 1.0  # seconds, the longest a reply waits for others
+replies = ReplyBatcher(REPLY_WINDOW)
+
+
+async def convert_times(ctx):
+    """Message hook, replies with the times mentioned in a message converted for everyone"""
+    m = ctx.message
+    note_author(m)
+
+    with metrics.timer("time_parse_seconds"):
+        mentions = parse_times(m.content, limit=3)
+    if mentions:
+        # used to deal with complex chaining of sentences such as "12pm my time or 3pm for @person or 5pm for @anotherperson"
+        embeds = [discord.Embed(color=discord.Color.dark_embed(), description=''),
+                  discord.Embed(color=discord.Color.dark_embed(), description=''),
+                  discord.Embed(color=discord.Color.dark_embed(), description='')]
+        embed_order = []  # no members in order yet
+        # `for @user` mentions are resolved concurrently, then applied in message order
+        mentioned = await asyncio.gather(*(resolve_mention(ctx, mention.target) for mention in mentions))
+        for mention, member in zip(mentions, mentioned):
+            parse_time_to_tz(m, mention, member, embeds, embed_order)
+        resultant_embs = [emb for emb in embeds if emb.description]
+        if resultant_embs:
+            replies.add(m.channel, resultant_embs)
+
+
+class TimezoneToggle(View):
+    def __init__(self):
+        super().__init__(timeout=120)
+
+    @discord.ui.button(label="Turn On", style=discord.ButtonStyle.green)
+    async def callback(self, interaction, btn):
+        if not data.get(str(interaction.user.id), {}).get('timezone'):
+            return await interaction.response.send_message("You have not yet set a timezone, use %tz newtimezone or </timezone set:1257289655242719392>", ephemeral=True)
+        await interaction.response.send_message('Turned ON live universal time response! Test it out by entering `11am` into the chat!', ephemeral=True)
+        data[str(interaction.user.id)]['enabled'] = True
+        update_db(interaction.user.id)
+
+
+@commands.hybrid_group(
+    name="timezone", description="Set your timezone for global times for everyone in chat",
+    aliases=('tz', 'mytz', 'mytimezone'), fallback="set"
+)
+async def timezone(ctx, new_timezone=None):
+    if new_timezone:
+        if new_timezone not in timezones:
+            return await ctx.send('Unable to find mentioned timezone, please check in the following list to find your timezone:-\n**All shown timezones are sorted in ascending order for ease of finding your timezone!**', embed=tz_page_embed(0), view=AllTimezonePaginator(), ephemeral=True)
+
+        await ctx.send(f'Your timezone has now been set to `{new_timezone}`. Click below to get started! Use `%tz help` or </timezone help:1257289655242719392> to know more!!', view=TimezoneToggle())
+        data[str(ctx.author.id)] = {'timezone': new_timezone, 'enabled': data.get(str(ctx.author.id), {}).get('enabled') or False}
+        update_db(ctx.author.id)
+    else:
+        if str(ctx.author.id) not in data:
+            return await ctx.send('You have not set any timezone yet for it to be reset. Use `%tz help` or </timezone help:1257289655242719392> to know more!!', ephemeral=True)
+
+        await ctx.send('Successfully cleared your timezone. Set a new one via `%tz timezone` or </timezone set:1257289655242719392>', ephemeral=True)
+        data[str(ctx.author.id)]['timezone'] = None
+        update_db(ctx.author.id)
+
+
+@timezone.autocomplete('new_timezone')
+async def timezone_autocomplete(interaction, current: str):
+    global tz_search
+    if tz_search is None:
+        tz_search = TimezoneSearch(timezones)
+    return [discord.app_commands.Choice(name=tz, value=tz) for tz in tz_search.search(current)]
+
+
+@timezone.command(name='help')
+async def help_(ctx):
+    """Guide for the timezone command"""
+    emb = discord.Embed(color=discord.Color.brand_red(), title=f"🌐 Global Timezoner")
+    emb.description = """
+Engage in easy time conversations, where each time you mention is viewable by everyone in their own timezone. 
+Simply specify your timezone in </timezone set:1257289655242719392> and enjoy the magic after turning it on via </timezone on:1257289655242719392>!
+## Privacy Policy:
+Raichu bot takes your privacy seriously.
+Your timezone is private and no one can view it directly!
+Raichu bot will never specify your timezone.
+## Usage:
+Usage involves specifying time in 12 hour format with am/pm, 24 hour format, noon or midnight
+For example:-
+- let's battle at 6pm my time
+- does 11am suit you?
+- free from 5-7pm on friday
+- 18:30 tomorrow works
+In-case you don't mention am/pm, the bot will show both times.
+
+Additionally, you can use our smart syntax `<time> for <@member>`
+to view global time according to someone else's time zone
+For example:-
+- let's battle when it is 8:15pm for @intenzi
+- I want to know what time it is for me when it is 3am for @otherperson
+Simply add `for @user` to any mentioned time, to view your time according to someone else's timezone
+## Setup:
+</timezone help:1257289655242719392>  -> shows this command
+</timezone info:1257289655242719392>  -> view all available timezones
+</timezone everyone:1257289655242719392> <time>  -> show a time for everyone active in this channel
+</timezone set:1257289655242719392> <new timezone>  -> setup your timezone
+</timezone on:1257289655242719392>   -> turn on global time shower for your time based messages
+</timezone off:1257289655242719392>  -> turn off global time shower for your time based messages
+"""
+    emb.set_footer(text="Built with ❤️ by Intenzi")
+    await ctx.send(embed=emb)
+
+
+@timezone.command(name='everyone', aliases=('here', 'all'))
+async def everyone(ctx, *, when: str):
+    """Show a time for everyone active in this channel"""
+    tz = data.get(str(ctx.author.id), {}).get('timezone')
+    if not tz:
+        return await ctx.send("You have not yet set a timezone, use %tz newtimezone or </timezone set:1257289655242719392>", ephemeral=True)
+    mentions = parse_times(when, limit=1)
+    if not mentions:
+        return await ctx.send("Couldn't find a time in that, try something like `6pm` or `18:30 tomorrow`", ephemeral=True)
+
+    # only how many people are at each offset is shown, never who or which zone
+    zone_counts = {tz: 1}
+    for user_id in active_authors(ctx.channel.id):
+        entry = data.get(str(user_id))
+        if user_id != ctx.author.id and entry and entry['enabled'] and entry['timezone'] in timezones:
+            zone_counts[entry['timezone']] = zone_counts.get(entry['timezone'], 0) + 1
+
+    embeds = []
+    # ambiguous 12h times come back as both the pm and am reading
+    for start, end in resolve_time(mentions[0], datetime.now(timezones.zone(tz))):
+        ts = start.timestamp()
+        lines = []
+        for offset, count in sorted(offset_table.group(zone_counts, ts).items()):
+            local = wall_clock(ts, offset).strftime('%A, %I:%M %p')
+            if end is not None:
+                local += wall_clock(end.timestamp(), offset).strftime(' - %I:%M %p')
+            lines.append(f"- {local} ▪ {format_offset(offset)} ▪ {count} {'person' if count == 1 else 'people'}")
+        label = clock_label(start) if end is None else f"{clock_label(start)} - {clock_label(end)}"
+        embeds.append(discord.Embed(color=discord.Color.gold(), title=f"🌐 {label} for everyone here", description="\n".join(lines)))
+    await ctx.send(embeds=embeds)
+
+
+@timezone.command(name='info')
+async def information(ctx):
+    """Show all available timezones"""
+    await ctx.send(content="All shown timezones are sorted in ascending order for ease of finding your timezone!", embed=tz_page_embed(0), view=AllTimezonePaginator())
+
+
+@timezone.command()
+async def on(ctx):
+    """Start showing global time for times mentioned by you"""
+    if not data.get(str(ctx.author.id), {}).get('timezone'):
+        return await ctx.send("You have not yet set a timezone, use %tz newtimezone or </timezone set:1257289655242719392>")
+
+    await ctx.send('Turned ON live universal time response! Test it out by entering `11am` into the chat!', ephemeral=True)
+    data[str(ctx.author.id)]['enabled'] = True
+    update_db(ctx.author.id)
+
+
+@timezone.command()
+async def off(ctx):
+    """Stop showing global time for times mentioned by you"""
+    if not data.get(str(ctx.author.id), {}).get('timezone'):
+        return await ctx.send("You have not yet set a timezone, use %tz newtimezone or </timezone set:1257289655242719392>")
+
+    await ctx.send('Turned OFF live universal time response!', ephemeral=True)
+    data[str(ctx.author.id)]['enabled'] = False
+    update_db(ctx.author.id)
+
+
+# names resolved by member_lookup go stale when members rename, join or leave
+async def on_member_update(before_m, after_m):
+    if before_m.nick != after_m.nick:
+        member_lookup.forget(after_m.id)
+
+
+async def on_user_update(before_u, after_u):
+    if (before_u.name, before_u.global_name) != (after_u.name, after_u.global_name):
+        member_lookup.forget(after_u.id)
+
+
+async def on_member_join(member):
+    member_lookup.forget_misses()
+
+
+async def on_member_remove(member):
+    member_lookup.forget(member.id)
+
+
+async def setup(bot):
+    core.listen(on_member_update, on_user_update, on_member_join, on_member_remove)
+    core.message_hooks.append(convert_times)
+    bot.add_command(timezone)
+
+
+async def teardown(bot):
+    core.message_hooks.remove(convert_times)
+    await replies.flush_all()
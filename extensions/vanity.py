@@ -0,0 +1,402 @@
+import asyncio
+import functools
+import re
+import time
+from datetime import datetime
+
+import discord
+from discord.ext import commands
+
+import core
+from core import bot, metrics
+from dotenv import GUILD_ID, ALLY_role
+from utils.cooldowns import CooldownMap
+from utils.mutations import RoleMutationQueue
+from utils.presence import PresenceCoalescer
+from utils.scheduler import BoundedScheduler
+
+db = core.open_db()
+
+vanity_cooldowns = CooldownMap(ttl=30)  # 30 seconds before a removed ally role can be given back
+site_pattern = r'(?:http://|https://|)(?:www\.|)pokearena.xyz'
+vanity_pattern = r'(?:\.gg|discord\.gg)/pokearena'
+# one pass for both, the invite only counts once the server is level 3 and has its vanity url
+vanity_matchers = {
+    False: re.compile(rf'(?:^| )(?:{site_pattern})(?: |$)'),
+    True: re.compile(rf'(?:^| )(?:{site_pattern}|{vanity_pattern})(?: |$)'),
+}
+vanity_matcher = None  # set from the guild's boost level, see current_vanity_matcher
+
+
+def update_vanity_tier(guild):
+    """Called from on_ready and on_guild_update, the only times the boost level can change, and on first match"""
+    global vanity_matcher
+    vanity_matcher = vanity_matchers[guild.premium_tier == 3]
+
+
+def current_vanity_matcher():
+    # presence updates arrive while the guild is still chunking, well before on_ready, the guild object already
+    # has its boost level by then
+    if vanity_matcher is None:
+        guild = bot.get_guild(GUILD_ID)
+        if guild is None:
+            return vanity_matchers[False]
+        update_vanity_tier(guild)
+    return vanity_matcher
+
+
+def contains_vanity(status_content: str):
+    # both need the literal name, a substring check rules out nearly every status before the regex runs
+    return "pokearena" in status_content and current_vanity_matcher().search(status_content) is not None
+
+
+# user id -> {"channel": dm channel id, "message": ally dm id}, saves scanning dm history on every role change
+ally_dms = db.table("ally_dms")
+
+
+def ally_embed(member, action):
+    emb = discord.Embed(color=discord.Color.gold(), title='⭐ New Ally')
+    emb.description = f"<:like:1118127706928857149> Hey **{member.name.title()}**, it is commendable that you have" \
+                      " supported Pokearena Official! You are now an **Ally** of arena as our token of gratitude! 🌠"
+    emb.set_thumbnail(
+        url="https://cdn.discordapp.com/icons/1006542206569558116/583fa7c3571c84397ce5c4577cb6df63.png?size=1024")
+    emb.add_field(name="Last Updated:", value=discord.utils.format_dt(datetime.now(), "R"))
+    emb.add_field(name="Action Done:", value=action)
+    return emb
+
+
+def remember_ally_dm(member, message):
+    ally_dms[str(member.id)] = {"channel": message.channel.id, "message": message.id}
+    db.mark_dirty("ally_dms", member.id)
+
+
+async def edit_ally_dm(member, action):
+    """
+    Edit the ally dm sent to a member earlier
+    A single edit when its id is known, dm history is only scanned for dms sent before ids were stored
+    Returns False when there is no such dm
+    """
+    record = ally_dms.get(str(member.id))
+    if record is not None:
+        channel = bot.get_partial_messageable(record["channel"], type=discord.ChannelType.private)
+        try:
+            await channel.get_partial_message(record["message"]).edit(embed=ally_embed(member, action))
+            return True
+        except discord.NotFound:  # deleted, look for another one below
+            ally_dms.pop(str(member.id), None)
+            db.mark_dirty("ally_dms", member.id)
+
+    channel = member.dm_channel
+    if channel is None:
+        try:
+            channel = await member.create_dm()
+        except discord.HTTPException:
+            return False  # not possible
+    # Check channel history upto 20 msges
+    async for message in channel.history(limit=20):
+        if message.author != member and message.embeds and message.embeds[0].title == "⭐ New Ally":
+            await message.edit(embed=ally_embed(member, action))
+            remember_ally_dm(member, message)
+            return True
+    return False
+
+
+async def greenlist_vanity_emb(member: discord.Member):
+    """
+    Called when a member is provided vanity role
+    To send a dm/modify sent dm
+    """
+    action = "✅ Added **Ally** role to you"
+    if await edit_ally_dm(member, action):
+        return
+    channel = member.dm_channel
+    if channel is None:
+        return  # not possible
+    message = await channel.send(embed=ally_embed(member, action))
+    remember_ally_dm(member, message)
+
+
+async def redlist_vanity_emb(member: discord.Member):
+    """
+    Called when a member is removed from vanity role
+    To modify sent dm if applicable
+    """
+    await edit_ally_dm(member, "❌ Removed **Ally** role from you")
+
+
+def has_vanity_status(member):
+    """Online with a vanity link in their custom status"""
+    if member.raw_status == "offline":
+        return False
+    return any(isinstance(activity, discord.CustomActivity) and contains_vanity(str(activity.name)) for activity in member.activities)
+
+
+def vanity_state(member):
+    """The only parts of a presence the ally role depends on"""
+    custom_status = next((str(a.name) for a in member.activities if isinstance(a, discord.CustomActivity)), None)
+    return member.raw_status == "offline", custom_status, member.get_role(ALLY_role) is not None
+
+
+async def give_vanity(member):
+    await member.add_roles(member.guild.get_role(ALLY_role))
+    vanity_cooldowns.discard(member.id)
+    await greenlist_vanity_emb(member)
+
+
+async def take_vanity(member):
+    await member.remove_roles(member.guild.get_role(ALLY_role))
+    vanity_cooldowns.set(member.id)
+    await redlist_vanity_emb(member)
+
+
+def has_ally(member):
+    return member.get_role(ALLY_role) is not None
+
+
+async def set_vanity(member, wanted):
+    try:
+        await (give_vanity(member) if wanted else take_vanity(member))
+    except Exception:
+        # the presence queue already counts this state as handled, without this the member would stay out of
+        # line until their status changes again
+        presence_queue.forget(member.id)
+        raise
+
+
+# role changes from presence updates wait here briefly, a member toggling their status costs one request at most
+role_changes = RoleMutationQueue(has_ally, set_vanity, BoundedScheduler(concurrency=2, per_second=2))
+
+
+def clear_vanity_oncheck(member):
+    if has_ally(member) and not has_vanity_status(member):
+        role_changes.want(member, False)
+        return True
+
+
+def plan_vanity(guild, members=None):
+    """Members whose ally role disagrees with their cached presence, worked out before any request is sent"""
+    to_add, to_remove = [], []
+    for member in guild.members if members is None else members:
+        if member.bot:
+            continue
+        has_role = has_ally(member)
+        if has_role == has_vanity_status(member):
+            continue
+        if has_role:
+            to_remove.append(member)
+        elif member.id not in vanity_cooldowns:
+            to_add.append(member)
+    return to_add, to_remove
+
+
+vanity_scheduler = BoundedScheduler(concurrency=4, per_second=5)
+vanity_reconciling = False
+
+
+async def reconcile_vanity(guild, progress=None, members=None):
+    """Brings every member's (or just `members`') ally role in line with their presence, returns (added, removed, failed)"""
+    global vanity_reconciling
+    if vanity_reconciling:
+        return None
+    vanity_reconciling = True
+    try:
+        to_add, to_remove = plan_vanity(guild, members)
+        jobs = [functools.partial(take_vanity, m) for m in to_remove] + [functools.partial(give_vanity, m) for m in to_add]
+        _, failed = await vanity_scheduler.run(jobs, progress)
+        return len(to_add), len(to_remove), failed
+    finally:
+        vanity_reconciling = False
+
+
+# warm restarts: vanity cooldowns and the vanity state of every member survive a reboot
+runtime = db.table("runtime")
+SNAPSHOT_INTERVAL = 5 * 60
+SNAPSHOT_MAX_AGE = 6 * 60 * 60  # an older snapshot is too stale to trust, startup rescans everyone
+restored_states = None  # member id -> vanity state when the snapshot was taken, used up by the first on_ready
+restored_tier = None  # the guild's boost level then, the invite link only counts at level 3
+snapshot_task = None
+reconcile_task = None  # the startup check run by on_ready, kept so it can't be garbage collected mid-way
+
+
+def save_snapshot():
+    guild = bot.get_guild(GUILD_ID)
+    if guild is None:
+        return  # never got the guild, keep the previous snapshot
+    # members without a custom status or ally role are left out, they need nothing whatever their state
+    # members out of line (mid cooldown, failed request) are left out too, so the next startup checks them
+    states = {}
+    for member in guild.members:
+        if member.bot:
+            continue
+        state = vanity_state(member)
+        if (state[1] is not None or state[2]) and state[2] == has_vanity_status(member):
+            states[str(member.id)] = state
+    runtime["snapshot"] = {
+        "saved_at": time.time(),
+        "premium_tier": guild.premium_tier,
+        "cooldowns": {str(member_id): left for member_id, left in vanity_cooldowns.remaining().items()},
+        "states": states,
+    }
+    db.mark_dirty("runtime", "snapshot")
+
+
+def load_snapshot():
+    global restored_states, restored_tier
+    snapshot = runtime.get("snapshot")
+    if snapshot is None:
+        return
+    age = time.time() - snapshot["saved_at"]
+    for member_id, left in snapshot["cooldowns"].items():
+        if left > age:
+            vanity_cooldowns.set(int(member_id), ttl=left - age)
+    if age < SNAPSHOT_MAX_AGE:
+        restored_states = {int(member_id): tuple(state) for member_id, state in snapshot["states"].items()}
+        restored_tier = snapshot.get("premium_tier")  # None in snapshots from before it was saved, forces a rescan
+
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        save_snapshot()
+
+
+def changed_since_snapshot(guild, states):
+    """Members whose vanity state differs from the snapshot, everyone else was in line when it was taken"""
+    changed = []
+    for member in guild.members:
+        if member.bot:
+            continue
+        state = vanity_state(member)
+        saved = states.get(member.id)
+        if saved == state or saved is None and state[1] is None and not state[2]:
+            continue
+        changed.append(member)
+    return changed
+
+
+async def fix_vanity_on_ready(guild):
+    # roles may have drifted while the bot was down, after a warm restart only members that changed are checked
+    # unless the boost level changed too, then the same status can mean something else and everyone is rescanned
+    global restored_states
+    members = None
+    if restored_states is not None:
+        if guild.premium_tier == restored_tier:
+            members = changed_since_snapshot(guild, restored_states)
+        restored_states = None
+    result = await reconcile_vanity(guild, members=members)
+    if result:
+        checked = len(guild.members) if members is None else len(members)
+        print("Vanity reconciled over {} members: +{} -{} ({} failed)".format(checked, *result))
+
+
+@commands.command()
+@commands.is_owner()
+async def fix_vanity(ctx):
+    # runs on its own in on_ready, this is for manual re-checks
+    msg = await ctx.send('Checking members...')
+
+    async def progress(done, total):
+        await msg.edit(content=f'Fixing vanity roles... {done}/{total}')
+
+    result = await reconcile_vanity(ctx.guild, progress)
+    if result is None:
+        return await msg.edit(content='A vanity fix is already running.')
+    added, removed, failed = result
+    await msg.edit(content=f'Fixed from {removed} members, added to {added} members.' + (f' {failed} failed.' if failed else ''))
+
+
+@commands.hybrid_command(aliases=('vanity', ))
+@commands.cooldown(1, 2.0, commands.BucketType.channel)
+async def ally(ctx):
+    """%ally, info on obtaining vanity role"""
+    emb = discord.Embed(color=discord.Color.blurple())
+    emb.title = "🔥 Arena Rewards!"
+    availability = "" if ctx.guild.premium_tier == 3 else "❌ discord.gg/pokearena is unavailable until Server reaches level 3 -> see %boost"
+    emb.description = f"""
+╔⏤‧˚❀༉.⏤╝❀╚⏤⏤⏤⏤╗
+Time limited <@&{ALLY_role}> role
+╚⏤⏤⏤⏤╗❀╔⏤‧˚❀༉.⏤╝
+
+💭 How to obtain?
+`Ans:` **Add discord.gg/pokearena or pokearena.xyz into your 📝custom status** and our Helper {ctx.bot.user.mention} will give you the role, along with a thankyou note <:like:1118127706928857149> 
+
+💖 The ally role is hoisted and will show off higher than level roles ✨ 
+⚠️ It goes away if you take away the status/go offline
+"""
+    if availability:
+        emb.set_footer(text=availability)
+    await ctx.send(embed=emb)
+
+
+@metrics.timed("task")
+async def update_vanity(member):
+    wanted = has_vanity_status(member)
+    if wanted and not has_ally(member) and member.id in vanity_cooldowns:
+        # on cooldown, let the next presence event retry even if the status stays the same
+        presence_queue.forget(member.id)
+        return
+    if wanted != has_ally(member) or member.id in role_changes:  # a pending change may need cancelling
+        role_changes.want(member, wanted)
+
+
+# game activity/platform changes and online <-> idle flicker don't reach the role logic
+presence_queue = PresenceCoalescer(update_vanity, vanity_state)
+
+
+async def on_ready():
+    global reconcile_task
+    guild = bot.get_guild(GUILD_ID)
+    if guild is not None:
+        update_vanity_tier(guild)
+        reconcile_task = asyncio.create_task(fix_vanity_on_ready(guild))
+
+
+async def on_guild_update(before_g, after_g):
+    if after_g.id == GUILD_ID and before_g.premium_tier != after_g.premium_tier:
+        update_vanity_tier(after_g)
+
+
+async def on_member_join(member):
+    """remove role from rejoiners that get it added back via carl sticky role"""
+    if member.guild.id != GUILD_ID or member.bot:
+        return
+
+    await asyncio.sleep(2)
+    clear_vanity_oncheck(member)
+
+
+async def on_member_remove(member):
+    if member.guild.id == GUILD_ID:
+        presence_queue.forget(member.id)
+        role_changes.discard(member.id)
+
+
+async def on_presence_update(before_m, after_m):
+    """vanity role"""
+    if after_m.bot or after_m.guild.id != GUILD_ID:
+        return
+    presence_queue.submit(after_m)
+
+
+async def setup(bot):
+    global snapshot_task
+    load_snapshot()
+    presence_queue.start()
+    vanity_cooldowns.start()
+    snapshot_task = asyncio.create_task(snapshot_loop())
+    core.listen(on_ready, on_guild_update, on_member_join, on_member_remove, on_presence_update)
+    bot.add_command(fix_vanity)
+    bot.add_command(ally)
+
+
+async def teardown(bot):
+    # runs on shutdown too, bot.close() unloads every extension while the member cache is still there
+    snapshot_task.cancel()
+    if reconcile_task is not None:
+        reconcile_task.cancel()
+    presence_queue.stop()
+    # unsent changes are dropped rather than sent while closing, the snapshot leaves out members whose role
+    # doesn't match their status so the next startup checks them again
+    role_changes.stop()
+    vanity_cooldowns.stop()
+    save_snapshot()
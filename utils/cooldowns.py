@@ -0,0 +1,84 @@
+import asyncio
+import math
+import time
+
+
+class CooldownMap:
+    """
+    Keys on cooldown, expired in the background by a timing wheel of `resolution` second slots
+    set, check and expiry are O(1); lookups are a plain dict check with no clock reads
+    """
+
+    def __init__(self, ttl, max_size=10_000, slots=64, resolution=1.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.resolution = resolution
+        self._expiry = {}  # key -> tick it expires at, insertion ordered so the first key is the oldest
+        self._wheel = [set() for _ in range(slots)]
+        self._tick = self._now_tick()
+        self._task = None
+        self.hits = self.expired = self.evicted = 0
+
+    def _now_tick(self):
+        return int(time.monotonic() / self.resolution)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.resolution)
+            self.advance()
+
+    def set(self, key, ttl=None):
+        expires = self._now_tick() + math.ceil((self.ttl if ttl is None else ttl) / self.resolution)
+        if self._expiry.pop(key, None) is None and len(self._expiry) >= self.max_size:
+            # over the memory cap, drop the entry closest to expiring anyway
+            self._expiry.pop(next(iter(self._expiry)))
+            self.evicted += 1
+        self._expiry[key] = expires
+        self._wheel[expires % len(self._wheel)].add(key)
+
+    def discard(self, key):
+        # its wheel slot is cleaned up lazily
+        self._expiry.pop(key, None)
+
+    def __contains__(self, key):
+        if key in self._expiry:
+            self.hits += 1
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def remaining(self):
+        """key -> seconds left, for saving state"""
+        now = self._tick
+        return {key: (expires - now) * self.resolution for key, expires in self._expiry.items()}
+
+    def advance(self):
+        """Expire everything due by now, called every tick by the background task"""
+        target = self._now_tick()
+        steps = min(target - self._tick, len(self._wheel))  # a long stall still visits each slot only once
+        for tick in range(self._tick + 1, self._tick + steps + 1):
+            slot = self._wheel[tick % len(self._wheel)]
+            for key in list(slot):
+                expires = self._expiry.get(key)
+                if expires is None:  # discarded or evicted
+                    slot.discard(key)
+                elif expires <= target:
+                    slot.discard(key)
+                    del self._expiry[key]
+                    self.expired += 1
+                # otherwise it is due on a later lap of the wheel (or was re-set into another slot)
+        self._tick = max(self._tick, target)
+
+    def stats(self):
+        return {"size": len(self._expiry), "hits": self.hits, "expired": self.expired, "evicted": self.evicted}
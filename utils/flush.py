@@ -0,0 +1,57 @@
+import asyncio
+import traceback
+
+
+class FlushTimer:
+    """
+    Runs an async `flush` a delay after it is first armed, for write-behind and batching queues
+    Arming again does not reset the timer so the delay stays bounded, and arming while a timed flush is running
+    is left to that flush: once it is done it re-arms itself if `pending()` says work came in meanwhile
+    """
+
+    def __init__(self, flush, pending):
+        self.flush = flush  # async callable, also called directly by owners that want to flush now
+        self.pending = pending  # callable, True while there is something left to flush
+        self._delay = None
+        self._handle = None
+        self._task = None  # kept so the running flush can't be garbage collected mid-way
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    @property
+    def armed(self):
+        """A flush is scheduled or running, the work queued now will be picked up by it"""
+        return self._handle is not None or self.running
+
+    def arm(self, delay):
+        """Schedule a flush in `delay` seconds unless one is already coming, raises RuntimeError outside of an event loop"""
+        if not self.armed:
+            self._delay = delay  # the re-arm after a timed flush waits as long
+            self._handle = asyncio.get_running_loop().call_later(delay, self._start)
+
+    def cancel(self):
+        """Drop the scheduled flush, owners call this when flushing directly"""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def stop(self):
+        """Drop the scheduled flush and cancel a running one, for shutdown"""
+        self.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _start(self):
+        self._handle = None
+        self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        try:
+            await self.flush()
+        except Exception:  # nobody awaits this task, print it and let pending() decide whether to try again
+            traceback.print_exc()
+        if self.pending() and self._handle is None:
+            self._handle = asyncio.get_running_loop().call_later(self._delay, self._start)
@@ -0,0 +1,58 @@
+"""
+Compact member cache mode
+discord.py has to keep every member cached: presence updates for uncached members are dropped and role edits need
+the Member. So instead of replacing that cache, this trims what goes into it down to what the bot reads:
+roles, booster status, online/offline and the custom status
+"""
+import discord
+
+CUSTOM_STATUS = discord.ActivityType.custom.value
+
+
+def compact_intents():
+    """Only the gateway events the bot handles, the rest (voice states, emojis, reactions, invites...) is never cached"""
+    return discord.Intents(guilds=True, members=True, presences=True, guild_messages=True, dm_messages=True,
+                           message_content=True)
+
+
+def cache_options(intents):
+    """Client kwargs for compact mode"""
+    return {
+        "intents": intents,
+        "max_messages": None,  # nothing reads the message cache, every handler uses the message it is given
+        "member_cache_flags": discord.MemberCacheFlags.from_intents(intents),
+    }
+
+
+def _slim(presence):
+    # games, spotify, streaming... each become a full Activity object per member, only the custom status is read
+    activities = presence.get("activities")
+    if activities:
+        presence["activities"] = [activity for activity in activities if activity.get("type") == CUSTOM_STATUS]
+    return presence
+
+
+def _slim_list(key):
+    def slim(data):
+        for presence in data.get(key) or ():
+            _slim(presence)
+        return data
+    return slim
+
+
+_slimmers = {
+    "PRESENCE_UPDATE": _slim,
+    "GUILD_CREATE": _slim_list("presences"),
+    "GUILD_MEMBERS_CHUNK": _slim_list("presences"),
+}
+
+
+def install(connection):
+    """Strips presences before discord.py parses them, call before connecting"""
+    for event, slim in _slimmers.items():
+        parser = connection.parsers[event]
+
+        def parse(data, parser=parser, slim=slim):
+            parser(slim(data))
+
+        connection.parsers[event] = parse
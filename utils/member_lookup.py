@@ -0,0 +1,64 @@
+import re
+
+from discord.ext import commands
+
+_member_id = re.compile(r'<@!?(\d{15,21})>$|(\d{15,21})$')
+
+
+class MemberLookup:
+    """
+    `for <user>` text -> member, per guild
+    Mentions and ids are a member cache lookup, names go through MemberConverter (name search, maybe an API query)
+    once and are remembered until that member changes name or leaves; misses until someone joins or renames
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._hits = {}  # (guild id, text) -> member id, insertion ordered so the first key is the oldest
+        self._keys = {}  # member id -> keys resolving to them, for invalidation
+        self._misses = set()  # (guild id, text) that matched nobody
+        self.cached = self.converted = 0
+
+    async def resolve(self, ctx, text):
+        guild = ctx.guild
+        if guild is None:
+            return None
+        match = _member_id.match(text)
+        if match:
+            member = guild.get_member(int(match.group(1) or match.group(2)))
+            if member is not None:
+                self.cached += 1
+                return member
+        key = (guild.id, text)
+        if key in self._misses:
+            self.cached += 1
+            return None
+        member = guild.get_member(self._hits.get(key, 0))
+        if member is not None:
+            self.cached += 1
+            return member
+
+        self.converted += 1
+        try:
+            member = await commands.MemberConverter().convert(ctx, text)
+        except commands.MemberNotFound:
+            if len(self._misses) >= self.max_size:
+                self._misses.clear()
+            self._misses.add(key)
+            return None
+        if len(self._hits) >= self.max_size:
+            oldest = next(iter(self._hits))
+            self._keys.get(self._hits.pop(oldest), set()).discard(oldest)
+        self._hits[key] = member.id
+        self._keys.setdefault(member.id, set()).add(key)
+        return member
+
+    def forget(self, member_id):
+        """Member renamed or left, names that pointed at them have to be looked up again"""
+        for key in self._keys.pop(member_id, ()):
+            self._hits.pop(key, None)
+        self._misses.clear()  # their new name may be one that matched nobody before
+
+    def forget_misses(self):
+        """Someone joined, a name that matched nobody might match them now"""
+        self._misses.clear()
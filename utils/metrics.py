@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import os
+import re
+import time
+from contextlib import contextmanager
+
+import aiohttp
+
+# seconds, tuned for discord handlers: sub-millisecond parsing up to multi-second REST bursts
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_snowflake = re.compile(r'/\d{15,21}')
+_api_version = re.compile(r'^/api/v\d+')
+
+
+def _write_file(path, text):
+    # written to a temp file first so scrapers never read half a file
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fp:
+        fp.write(text)
+    os.replace(tmp, path)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation"""
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts[:-1]):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[i]
+        return float("inf")
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Metrics:
+    """Counters and latency histograms for handlers, gateway events and REST calls"""
+
+    def __init__(self, prefix="raichu"):
+        self.prefix = prefix
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.started = time.time()
+        self._export_task = None
+
+    def inc(self, name, value=1, **labels):
+        key = (f"{self.prefix}_{name}", _labels(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (f"{self.prefix}_{name}", _labels(labels))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def instrument(self, kind, func, name=None):
+        """Wraps a coroutine function with a latency histogram and an error counter, labelled `name` or the function's"""
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                self.inc("handler_errors_total", kind=kind, handler=name)
+                raise
+            finally:
+                self.observe("handler_seconds", time.perf_counter() - start, kind=kind, handler=name)
+
+        return wrapper
+
+    def timed(self, kind):
+        """Decorator form of instrument()"""
+        return functools.partial(self.instrument, kind)
+
+    def rest_trace(self):
+        """aiohttp trace config timing every REST call, pass it as the client's http_trace"""
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.start = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            route = _snowflake.sub("/:id", _api_version.sub("", params.url.path))
+            self.observe("rest_seconds", time.perf_counter() - context.start, method=params.method, route=route)
+            self.inc("rest_responses_total", status=params.response.status)
+
+        async def on_request_exception(session, context, params):
+            self.inc("rest_errors_total", method=params.method)
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        return trace
+
+    def count_gateway_events(self, connection):
+        """
+        Counts gateway events by type as discord.py parses them, call before connecting
+        A wrapper around each parser rather than an on_socket_event_type handler, which costs a Task per event
+        """
+        for event, parser in list(connection.parsers.items()):
+            key = (f"{self.prefix}_gateway_events_total", _labels({"type": event}))
+
+            def parse(data, parser=parser, key=key):
+                self.counters[key] = self.counters.get(key, 0) + 1
+                parser(data)
+
+            connection.parsers[event] = parse
+
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        _write_file(path, self.render_prometheus())
+
+    def start_export(self, path, interval=60):
+        """Rewrites the prometheus text file every `interval` seconds"""
+        async def export():
+            while True:
+                await asyncio.sleep(interval)
+                # rendered on the loop so the metric dicts never change mid-render, the disk write is off it
+                await asyncio.get_running_loop().run_in_executor(None, _write_file, path, self.render_prometheus())
+
+        if self._export_task is None:
+            self._export_task = asyncio.create_task(export())
+
+    def summary(self, name):
+        """(labels, count, mean, p95) rows of a histogram, busiest first"""
+        name = f"{self.prefix}_{name}"
+        rows = [(dict(labels), h.count, h.sum / h.count, h.quantile(0.95))
+                for (metric, labels), h in self.histograms.items() if metric == name and h.count]
+        return sorted(rows, key=lambda row: row[1] * row[2], reverse=True)
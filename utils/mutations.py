@@ -0,0 +1,61 @@
+import functools
+
+from utils.flush import FlushTimer
+
+
+class RoleMutationQueue:
+    """
+    Outbound role changes, collapsed per member to the latest wanted state
+    An add -> remove -> add burst becomes at most one request, and a change that ends up where the member
+    already is gets dropped before anything is sent
+    """
+
+    def __init__(self, has_role, apply, scheduler, delay=2.0):
+        self.has_role = has_role  # member -> bool, the role state right now
+        self.apply = apply  # async callable(member, wanted) making the change
+        self.scheduler = scheduler  # BoundedScheduler the changes are sent through
+        self.delay = delay  # upper bound on how long a change waits for the member to make up their mind
+        self._pending = {}  # member id -> (member, wanted)
+        self._timer = FlushTimer(self.flush, lambda: bool(self._pending))
+        self.queued = self.cancelled = self.sent = 0
+
+    def want(self, member, wanted):
+        """Ask for the member to end up with (True) or without (False) the role"""
+        self.queued += 1
+        self._pending[member.id] = (member, wanted)
+        self._timer.arm(self.delay)
+
+    def stop(self):
+        """Drop every pending change and stop sending, for shutdown"""
+        self._timer.stop()
+        self._pending.clear()
+
+    def discard(self, member_id):
+        self._pending.pop(member_id, None)
+
+    def __contains__(self, member_id):
+        return member_id in self._pending
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def flush(self):
+        """Send all pending changes now"""
+        self._timer.cancel()
+        batch, self._pending = self._pending, {}
+        jobs = []
+        for member, wanted in batch.values():
+            if self.has_role(member) == wanted:  # cancelled out, or someone else already did it
+                self.cancelled += 1
+            else:
+                jobs.append(functools.partial(self._send, member, wanted))
+        if jobs:
+            await self.scheduler.run(jobs)
+
+    async def _send(self, member, wanted):
+        # a rate limited scheduler can start a job seconds after the batch was taken, check again right before sending
+        if member.id in self._pending or self.has_role(member) == wanted:  # a newer change is queued, or done already
+            self.cancelled += 1
+            return
+        self.sent += 1
+        await self.apply(member, wanted)
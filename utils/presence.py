@@ -0,0 +1,78 @@
+import asyncio
+import traceback
+
+
+class PresenceCoalescer:
+    """
+    Per-member coalescing queue for presence updates
+    Events that don't change the tracked state are dropped, a burst is handled once with the latest state
+    after it settles, and handling runs on a small pool of workers
+    """
+
+    def __init__(self, handler, state, settle=1.5, workers=3):
+        self.handler = handler  # async callable taking the member
+        self.state = state  # member -> hashable state the handler depends on
+        self.settle = settle
+        self.worker_count = workers
+        self._last = {}  # member id -> state last handed to the handler
+        self._pending = {}  # member id -> latest member object
+        self._active = set()  # member ids being handled right now
+        self._queue = asyncio.Queue()
+        self._workers = []
+        self.received = self.dropped = self.processed = 0
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    def stop(self):
+        """Cancel the workers, events still settling or queued are dropped"""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._pending.clear()  # their settle timers find nothing left to queue
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._active.clear()
+
+    def submit(self, member):
+        self.received += 1
+        if member.id in self._pending:
+            self._pending[member.id] = member  # timer already armed, just keep the latest state
+            return
+        if self._last.get(member.id) == self.state(member):
+            self.dropped += 1
+            return
+        self._pending[member.id] = member
+        # not re-armed by later events, so a member flickering non-stop still gets handled within `settle`
+        asyncio.get_running_loop().call_later(self.settle, self._settled, member.id)
+
+    def forget(self, member_id):
+        """Next event of this member gets handled even if its state looks unchanged"""
+        self._last.pop(member_id, None)
+
+    def _settled(self, member_id):
+        if member_id in self._active:  # still handling the previous state, check back later
+            asyncio.get_running_loop().call_later(self.settle, self._settled, member_id)
+            return
+        member = self._pending.pop(member_id, None)
+        if member is None:
+            return
+        if self._last.get(member_id) == self.state(member):  # flickered back to where it was
+            self.dropped += 1
+            return
+        self._active.add(member_id)
+        self._queue.put_nowait(member)
+
+    async def _worker(self):
+        while True:
+            member = await self._queue.get()
+            self._last[member.id] = self.state(member)
+            try:
+                await self.handler(member)
+                self.processed += 1
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._active.discard(member.id)
+                self._queue.task_done()
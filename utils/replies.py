@@ -0,0 +1,110 @@
+import asyncio
+import traceback
+
+import discord
+
+from utils.flush import FlushTimer
+
+# discord's limits for one message
+EMBEDS_PER_MESSAGE = 10
+CHARS_PER_MESSAGE = 6000  # summed over every embed's title, description, author, footer and fields
+CHARS_PER_DESCRIPTION = 4096
+
+
+class ReplyBatcher:
+    """
+    Time conversion replies, collected per channel for `window` seconds and sent together
+    Embeds with the same author are merged, lines already shown in the batch are dropped (same time, same
+    timestamps), and a batch over discord's embed limits is split over as few messages as it takes
+    """
+
+    def __init__(self, window=1.0):
+        self.window = window  # upper bound on how long a reply waits for others to join it
+        self._pending = {}  # channel id -> (channel, {(author name, icon url): [color, lines]}, lines seen)
+        self._timers = {}  # channel id -> FlushTimer, kept once made, there are only so many channels
+        self._flushing = 0
+        self.received = self.duplicates = self.sent = 0
+
+    def add(self, channel, embeds):
+        """Queue a message's reply embeds, each line of a description is one converted time"""
+        _, groups, seen = self._pending.setdefault(channel.id, (channel, {}, set()))
+        for embed in embeds:
+            group = groups.setdefault((embed.author.name, embed.author.icon_url), [embed.color, []])
+            for line in embed.description.splitlines(keepends=True):
+                self.received += 1
+                if line in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(line)
+                group[1].append(line)
+        self._timer(channel.id).arm(self.window)
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def busy(self):
+        """Replies waiting or being sent"""
+        return bool(self._pending) or self._flushing > 0
+
+    def _timer(self, channel_id):
+        timer = self._timers.get(channel_id)
+        if timer is None:
+            timer = self._timers[channel_id] = FlushTimer(
+                lambda: self.flush(channel_id), lambda: channel_id in self._pending)
+        return timer
+
+    async def flush(self, channel_id):
+        """Send a channel's pending replies now"""
+        self._timer(channel_id).cancel()
+        batch = self._pending.pop(channel_id, None)
+        if batch is None:
+            return
+        channel, groups, _ = batch
+        self._flushing += 1
+        try:
+            for embeds in _messages(groups):
+                self.sent += 1
+                try:
+                    await channel.send(embeds=embeds)
+                except Exception:
+                    traceback.print_exc()
+        finally:
+            self._flushing -= 1
+
+    async def flush_all(self):
+        await asyncio.gather(*(self.flush(channel_id) for channel_id in list(self._pending)))
+
+
+def _messages(groups):
+    """Embed lists for each message to send, within discord's limits"""
+    embeds = []
+    for (name, icon_url), (color, lines) in groups.items():
+        description = ""
+        for line in lines:
+            # a description only has to fit one embed, the message total is checked below
+            if description and len(description) + len(line) > min(CHARS_PER_DESCRIPTION, CHARS_PER_MESSAGE - len(name or "")):
+                embeds.append(_embed(name, icon_url, color, description))
+                description = ""
+            description += line
+        if description:
+            embeds.append(_embed(name, icon_url, color, description))
+
+    messages, current, size = [], [], 0
+    for embed in embeds:
+        length = len(embed)
+        if current and (len(current) == EMBEDS_PER_MESSAGE or size + length > CHARS_PER_MESSAGE):
+            messages.append(current)
+            current, size = [], 0
+        current.append(embed)
+        size += length
+    if current:
+        messages.append(current)
+    return messages
+
+
+def _embed(name, icon_url, color, description):
+    embed = discord.Embed(color=color, description=description)
+    if name:
+        embed.set_author(name=name, icon_url=icon_url)
+    return embed
@@ -0,0 +1,34 @@
+class RoleIndex:
+    """
+    role id -> ids of members holding it, kept only for the few roles the bot cares about
+    Built once from the member cache and then kept current from member events
+    """
+
+    def __init__(self):
+        self._members = {}
+
+    def rebuild(self, guild, role_ids):
+        """Full walk of the member cache, only done on (re)connect"""
+        self._members = {role_id: set() for role_id in role_ids if role_id is not None}
+        for member in guild.members:
+            self.add_member(member)
+
+    def add_member(self, member):
+        for role_id, holders in self._members.items():
+            if member.get_role(role_id) is not None:
+                holders.add(member.id)
+
+    def remove_member(self, member_id):
+        for holders in self._members.values():
+            holders.discard(member_id)
+
+    def update_member(self, member):
+        """Re-sync a single member after their roles changed"""
+        for role_id, holders in self._members.items():
+            if member.get_role(role_id) is not None:
+                holders.add(member.id)
+            else:
+                holders.discard(member.id)
+
+    def count(self, role_id):
+        return len(self._members.get(role_id, ()))
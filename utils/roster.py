@@ -0,0 +1,42 @@
+class Roster:
+    """
+    Pre-rendered member lines split into pages
+    Lines are rendered once per change, pages are joined on first view and kept until the roster changes
+    """
+
+    def __init__(self, render, per_page=50):
+        self.render = render  # member -> line
+        self.per_page = per_page
+        self.ready = False
+        self._lines = {}  # member id -> line, in display order
+        self._pages = {}
+
+    def rebuild(self, members):
+        self._lines = {member.id: self.render(member) for member in members}
+        self._pages.clear()
+        self.ready = True
+
+    def update(self, member):
+        """Add a member at the end, or re-render them in place"""
+        self._lines[member.id] = self.render(member)
+        self._pages.clear()
+
+    def discard(self, member_id):
+        if self._lines.pop(member_id, None) is not None:
+            self._pages.clear()
+
+    def __contains__(self, member_id):
+        return member_id in self._lines
+
+    def __len__(self):
+        return len(self._lines)
+
+    @property
+    def page_count(self):
+        return max(1, (len(self._lines) - 1) // self.per_page + 1)
+
+    def page(self, index):
+        if index not in self._pages:
+            lines = list(self._lines.values())[index * self.per_page:(index + 1) * self.per_page]
+            self._pages[index] = "\n".join(lines)
+        return self._pages[index]
@@ -0,0 +1,49 @@
+import asyncio
+import time
+import traceback
+
+
+class BoundedScheduler:
+    """
+    Runs a batch of REST-heavy jobs with a concurrency cap and a minimum spacing between starts,
+    so bulk work stays under the rate limits instead of bursting into 429s
+    """
+
+    def __init__(self, concurrency=4, per_second=5.0, progress_interval=5.0):
+        self.concurrency = concurrency
+        self.interval = 1 / per_second
+        self.progress_interval = progress_interval
+
+    async def run(self, jobs, progress=None):
+        """
+        jobs: list of zero-argument coroutine functions
+        progress: optional async callable(done, total), called at most every `progress_interval` seconds
+        Returns (succeeded, failed)
+        """
+        total = len(jobs)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pacing = asyncio.Lock()
+        last_start = 0
+        last_report = time.monotonic()
+        succeeded = failed = 0
+
+        async def run_one(job):
+            nonlocal last_start, last_report, succeeded, failed
+            async with semaphore:
+                async with pacing:  # spaces out request starts
+                    wait = last_start + self.interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    last_start = time.monotonic()
+                try:
+                    await job()
+                    succeeded += 1
+                except Exception:
+                    failed += 1
+                    traceback.print_exc()
+            if progress is not None and time.monotonic() - last_report >= self.progress_interval:
+                last_report = time.monotonic()
+                await progress(succeeded + failed, total)
+
+        await asyncio.gather(*(run_one(job) for job in jobs))
+        return succeeded, failed
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.flush import FlushTimer
+
+
+class Store:
+    """
+    SQLite backed key -> json store
+    Reads are served from plain in-memory dicts, writes are batched and flushed off the event loop
+    """
+
+    def __init__(self, path, flush_delay=2.0, on_flush=None):
+        self.path = path
+        self.flush_delay = flush_delay  # upper bound on how long a change waits before hitting disk
+        self.on_flush = on_flush  # optional callable(seconds), for timing flushes
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # a single writer thread keeps writes ordered and off the gateway loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._tables = {}
+        self._dirty = {}  # table name -> keys changed since last flush
+        self._timer = FlushTimer(self.flush, lambda: bool(self._dirty))
+
+    def table(self, name, legacy_json=None):
+        """
+        Returns the in-memory dict of a table, loading it on first use
+        legacy_json: json file to import from when the table is still empty (old database.json)
+        """
+        if name in self._tables:
+            return self._tables[name]
+
+        with self._conn:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        rows = {key: json.loads(value) for key, value in self._conn.execute(f'SELECT key, value FROM "{name}"')}
+        self._tables[name] = rows
+
+        if not rows and legacy_json and os.path.exists(legacy_json):
+            with open(legacy_json, "r") as fp:
+                rows.update(json.load(fp))
+            self._write([(name, key, json.dumps(value)) for key, value in rows.items()])
+        return rows
+
+    def mark_dirty(self, table, key):
+        """Queue a key for the next flush, a burst of changes ends up in one transaction"""
+        self._dirty.setdefault(table, set()).add(str(key))
+        try:
+            self._timer.arm(self.flush_delay)  # a flush already coming picks this key up as well
+        except RuntimeError:  # no loop (scripts/shutdown), write right away
+            self._write(self._collect())
+
+    def _collect(self):
+        # serialize on the loop thread so the writer never sees a dict mid-mutation
+        batch = []
+        for table, keys in self._dirty.items():
+            rows = self._tables[table]
+            for key in keys:
+                value = rows.get(key)
+                batch.append((table, key, None if value is None else json.dumps(value)))
+        self._dirty = {}
+        return batch
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._conn:  # one atomic transaction per batch
+            for table, key, value in batch:
+                if value is None:
+                    self._conn.execute(f'DELETE FROM "{table}" WHERE key = ?', (key,))
+                else:
+                    self._conn.execute(
+                        f'INSERT INTO "{table}" (key, value) VALUES (?, ?) '
+                        f'ON CONFLICT(key) DO UPDATE SET value = excluded.value', (key, value))
+
+    async def flush(self):
+        """Write all pending changes now"""
+        self._timer.cancel()
+        batch = self._collect()
+        if batch:
+            start = time.perf_counter()
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+            except Exception:
+                traceback.print_exc()
+                # the transaction was rolled back, queue the keys again and retry later, values are read fresh then
+                for table, key, _ in batch:
+                    self._dirty.setdefault(table, set()).add(key)
+                self._timer.arm(self.flush_delay)  # no-op in a timed flush, that one re-arms itself
+                return
+            if self.on_flush is not None:
+                self.on_flush(time.perf_counter() - start)
+
+    def close(self):
+        """Final synchronous flush, to be called once the event loop is gone"""
+        self._timer.cancel()
+        self._executor.shutdown(wait=True)
+        self._write(self._collect())
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.close()
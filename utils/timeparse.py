@@ -0,0 +1,363 @@
+"""
+Time expression parser for chat messages
+Regex prefilters find the few places a time could start, only those get tokenized and parsed with a bounded
+lookahead, so the work stays linear in message length and no pattern can backtrack
+
+Grammar (case insensitive, whitespace between tokens is free):
+    mention := [day] [keyword] clock [('-' | to) clock] [day] [for <target>]
+    clock   := H[:MM] [am|pm] | HH:MM (24h) | noon | midnight
+    day     := today | tonight | tomorrow | yesterday | day after tomorrow | day before yesterday | [on|next] <weekday>
+A lone number is not a time: it needs a keyword, minutes, am/pm, or yesterday/tomorrow/day after... next to it
+and it has to stand apart from the text around it ("9/11", "10%" and "5," are not times)
+"""
+import itertools
+import re
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+KEYWORDS = {"at", "by", "till", "until", "before", "after", "from", "around"}
+RANGE_WORDS = {"to", "till", "until"}
+DAY_WORDS = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1, "tmr": 1, "yesterday": -1}
+WEEKDAYS = {name: i for i, name in enumerate(
+    ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"))}
+MERIDIEMS = {"am": "am", "pm": "pm", "a.m": "am", "p.m": "pm"}
+_DAY_PATTERN = "|".join(["day", "on", "next", *DAY_WORDS, *WEEKDAYS])
+# cheap checks before tokenizing, they accept a superset of what the parser does and most chat fails them
+# without a single token being built; they run on lowercased text, IGNORECASE patterns can't use re's prefix scan
+_digit = re.compile(r'\d')  # only whether there is a digit matters, measured faster than searching for a run (\d+)
+_digits = re.compile(r'\d+')
+# matched at each number: minutes, am/pm or a day right after it
+_number_then = re.compile(rf'\d+\s*(?::\s*\d\d|[ap]\.?m(?![a-z])|(?:the\s+)?(?:{_DAY_PATTERN})\b)')
+# and a keyword or day right before it, spelled backwards and matched on the reversed text before the number;
+# a whole word like the tokenizer reads it, "won 2-3" doesn't end in "on"
+_word_before = re.compile(
+    rf'\W*(?:{"|".join(sorted({word[::-1] for word in (*KEYWORDS, *_DAY_PATTERN.split("|"))}))})(?![a-z0-9_])')
+_noon = re.compile(r'noon|midnight')
+# words a mention can start with besides a number
+_START_WORDS = KEYWORDS | DAY_WORDS.keys() | WEEKDAYS.keys() | {"the", "day", "on", "next", "noon", "midnight"}
+# the words and numbers a mention can have before the number a hit points at ("the day after tomorrow at", "5 -"),
+# backwards, the parser starts reading where they start instead of a fixed distance before the hit
+_LEAD_WORDS = "|".join(sorted({word[::-1] for word in _START_WORDS | RANGE_WORDS | MERIDIEMS.keys()}))
+_lead = re.compile(rf'(?:\W*(?:{_LEAD_WORDS}|\d+)(?![a-z0-9_]))*')
+
+
+class Clock(NamedTuple):
+    hour: int  # 0-23, or 1-12 when ambiguous
+    minute: int
+    ambiguous: bool  # 12h time without am/pm
+
+    def candidates(self):
+        """(hour, minute) readings, pm first like the bot always showed them"""
+        if not self.ambiguous:
+            return [(self.hour, self.minute)]
+        return [(self.hour + 12 if self.hour != 12 else 12, self.minute), (0 if self.hour == 12 else self.hour, self.minute)]
+
+
+class TimeMention(NamedTuple):
+    start: Clock
+    end: Optional[Clock]  # "5-7pm"
+    day_offset: int  # days from today
+    weekday: Optional[int]  # 0 = monday, resolved to the coming such day (today included)
+    target: Optional[str]  # the `for <user>` part, as written
+    keyword: Optional[str]
+    span: tuple
+
+
+# one alternative per token kind, no alternative can overlap another, so a scan is linear in the text length
+_token = re.compile(
+    r'(\d+)([a-z0-9_]*(?:\.m)?)'  # number, optionally glued to a suffix: 6pm, 6a.m, 2v2
+    r'|([a-z_][a-z0-9_]*(?:\.[a-z0-9_]+)*)'  # word, dots allowed inside: a.m, intenzi.x
+    r'|(<@!?\d+>)'  # user mention
+    r'|(\S)',  # anything else, one character at a time
+    re.IGNORECASE
+)
+_punct_kinds = {':': ':', '-': '-', '–': '-', '~': '-'}
+# tokens read ahead before each part of a mention, the longest part is 5 ("at 11 : 30 pm", "- 11 : 30 pm")
+_LOOKAHEAD = 5
+_LOOKBEHIND = 32  # the most chars a mention can have before a hit, "the day after tomorrow at" is 26
+
+
+def tokenize(text):
+    """(kind, value, start, end) tokens; kinds: num, word, mer, mention, ':', '-', punct"""
+    tokens = []
+    for chunk in _scan(text, 0):
+        tokens.extend(chunk)
+    return tokens
+
+
+def _scan(text, pos):
+    # yields the tokens of each match (6pm is two), so callers can stop reading early
+    for match in _token.finditer(text, pos):
+        group = match.lastindex
+        if group <= 2:
+            number, suffix = match.group(1, 2)
+            if not suffix:
+                yield (('num', number, match.start(), match.end()),)
+            elif suffix.lower() in MERIDIEMS:  # 6pm
+                yield ('num', number, match.start(), match.start(2)), ('mer', MERIDIEMS[suffix.lower()], match.start(2), match.end())
+            else:  # 2v2, 3rd...
+                yield (('word', match.group().lower(), match.start(), match.end()),)
+        elif group == 3:
+            word = match.group(3).lower()
+            yield (('mer', MERIDIEMS[word], match.start(), match.end()) if word in MERIDIEMS else ('word', word, match.start(), match.end()),)
+        elif group == 4:
+            yield (('mention', match.group(4), match.start(), match.end()),)
+        else:
+            char = match.group(5)
+            yield ((_punct_kinds.get(char, 'punct'), char, match.start(), match.end()),)
+
+
+def _read(tokens, scanner, count):
+    """Reads tokens until there are `count` of them or the text ends"""
+    for chunk in itertools.islice(scanner, count - len(tokens)):
+        tokens.extend(chunk)
+
+
+def _word(tokens, i):
+    return tokens[i][1] if i < len(tokens) and tokens[i][0] == 'word' else None
+
+
+def _clock(tokens, i):
+    """Returns (Clock, explicit, next index) or None; explicit means minutes/am-pm/24h were given"""
+    if i >= len(tokens):
+        return None
+    kind, value = tokens[i][0], tokens[i][1]
+    if kind == 'word' and value in ('noon', 'midnight'):
+        return Clock(12 if value == 'noon' else 0, 0, False), True, i + 1
+    if kind != 'num' or len(value) > 2:
+        return None
+    hour, minute, has_minute = int(value), 0, False
+    i += 1
+    if i + 1 < len(tokens) and tokens[i][0] == ':' and tokens[i + 1][0] == 'num' and len(tokens[i + 1][1]) == 2:
+        if int(tokens[i + 1][1]) > 59:
+            return None
+        minute, has_minute = int(tokens[i + 1][1]), True
+        i += 2
+    if i < len(tokens) and tokens[i][0] == 'mer':
+        if not 1 <= hour <= 12:
+            return None
+        if tokens[i][1] == 'pm' and hour != 12:
+            hour += 12
+        elif tokens[i][1] == 'am' and hour == 12:
+            hour = 0
+        return Clock(hour, minute, False), True, i + 1
+    if 13 <= hour <= 23 or (has_minute and (hour == 0 or len(value) == 2 and value[0] == '0')):
+        return Clock(hour, minute, False), has_minute, i  # 24h: 17:30, 00:15, 09:00, "at 18"
+    if 1 <= hour <= 12:
+        return Clock(hour, minute, True), has_minute, i
+    return None
+
+
+def _day(tokens, i):
+    """Returns (day offset, weekday, is tonight, next index) or None"""
+    word = _word(tokens, i)
+    if word == 'the' and _word(tokens, i + 1) == 'day':
+        i += 1
+        word = 'day'
+    if word == 'day':
+        after = (_word(tokens, i + 1), _word(tokens, i + 2))
+        if after == ('after', 'tomorrow'):
+            return 2, None, False, i + 3
+        if after == ('before', 'yesterday'):
+            return -2, None, False, i + 3
+        return None
+    if word in DAY_WORDS:
+        return DAY_WORDS[word], None, word == 'tonight', i + 1
+    skip = 1 if word in ('on', 'next') else 0
+    weekday = _word(tokens, i + skip)
+    if weekday in WEEKDAYS:
+        return 0, WEEKDAYS[weekday], False, i + skip + 1
+    return None
+
+
+def _standalone(text, start, last):
+    """
+    The clock is set apart from the text around it: whitespace or an opening bracket before it, and whitespace or
+    sentence punctuation after it; after am/pm, noon or midnight any punctuation will do ("6pm, see you")
+    """
+    before = text[start - 1] if start else " "
+    after = text[last[3]:last[3] + 1] or " "
+    if not (before.isspace() or before in "([{\"'"):
+        return False
+    return after.isspace() or after in ".?!" or last[0] != 'num' and not after.isalnum()
+
+
+def _tonight(clock):
+    # "9 tonight" is 9pm
+    if clock is not None and clock.ambiguous and clock.hour != 12:
+        return Clock(clock.hour + 12, clock.minute, False)
+    return clock
+
+
+def _first_hit(lowered, pos, noon):
+    """Where the next time could be from `pos` on, None if there is none; `noon` is where the next noon/midnight is"""
+    # each number is looked at once, with a bounded look on either side, so this stays linear
+    match = _digits.search(lowered, pos, noon)
+    while match is not None:
+        start = match.start()
+        if _number_then.match(lowered, start) or _word_before.match(lowered[max(pos, start - _LOOKBEHIND):start][::-1]):
+            return start
+        match = _digits.search(lowered, match.end(), noon)
+    return noon if noon < len(lowered) else None
+
+
+class _Message:
+    """
+    The tokens read so far of a message being parsed
+    Reused from one prefilter hit to the next, so a message full of false alarms is still only tokenized once
+    """
+    __slots__ = ("text", "lowered", "tokens", "scanner")
+
+    def __init__(self, text, lowered):
+        self.text = text
+        self.lowered = lowered
+        self.tokens = []
+        self.scanner = iter(())
+
+    def seek(self, pos):
+        """Index of the first token starting at or after `pos`"""
+        tokens = self.tokens
+        if not tokens or pos >= tokens[-1][3]:  # past everything read, skip the gap without tokenizing it
+            self.tokens = []
+            self.scanner = _scan(self.text, pos)
+            return 0
+        i = len(tokens)
+        while i and tokens[i - 1][2] >= pos:  # only the tokens read ahead for the last hit
+            i -= 1
+        return i
+
+
+def parse_times(text, limit=3):
+    """Time mentions in a message, in order, at most `limit`"""
+    lowered = text.lower()
+    noons = "noon" in lowered or "midnight" in lowered
+    if not noons and _digit.search(text) is None:  # most chat, nothing to set up for
+        return []
+    if len(lowered) != len(text):  # a few unicode letters lowercase to two characters, keep positions lined up
+        lowered = text.encode("ascii", "replace").decode().lower()
+    message = None
+    results = []
+    pos = 0
+    noon = -1
+    # the prefilters jump straight to each place a time could be, only those few spots get tokenized
+    while len(results) < limit:
+        if noon < pos:  # searched again only once the parser is past it, a noon at the very end is found once
+            match = _noon.search(lowered, pos) if noons else None
+            noon = match.start() if match else len(lowered)
+        first = _first_hit(lowered, pos, noon)
+        if first is None:
+            break
+        if message is None:
+            message = _Message(text, lowered)
+        mention, pos = _parse_near(message, first, pos)
+        if mention is not None:
+            results.append(mention)
+    return results
+
+
+def _parse_near(message, first, floor):
+    """
+    Parses the mention around a prefilter hit at `first`, reading no further back than `floor`
+    Returns (TimeMention or None, where to look next)
+    """
+    text = message.text
+    # read from the start of the words leading up to the hit so "the day after tomorrow at 6" is seen whole, and
+    # from the space before them so a token is never read from its middle ("foo.at 5"); lazily so it stops early
+    lead = _lead.match(message.lowered[max(floor, first - _LOOKBEHIND):first][::-1]).end()
+    i = message.seek(max(floor, text.rfind(" ", floor, first - lead) + 1))
+    tokens, scanner = message.tokens, message.scanner
+    day_before = None  # a day reference seen just before a time ("tomorrow at 6pm")
+    while True:
+        if i >= len(tokens):
+            chunk = next(scanner, None)
+            if chunk is None:
+                return None, len(text)
+            tokens.extend(chunk)
+        if tokens[i][2] > first and (day_before is None or i > day_before[1] + 1):
+            return None, first + 1  # nothing started at the hit, it was a false alarm
+        kind, value = tokens[i][0], tokens[i][1]
+        if kind != 'num' and (kind != 'word' or value not in _START_WORDS):
+            i += 1
+            continue
+        if i + _LOOKAHEAD > len(tokens):
+            _read(tokens, scanner, i + _LOOKAHEAD)
+
+        day = _day(tokens, i)
+        if day is not None:
+            day_before = (day, day[3])
+            i = day[3]
+            continue
+
+        start = i
+        keyword = value if kind == 'word' and value in KEYWORDS else None
+        parsed = _clock(tokens, i + 1 if keyword else i)
+        if parsed is None:
+            i += 1
+            continue
+        clock, explicit, i = parsed
+        if i + _LOOKAHEAD > len(tokens):
+            _read(tokens, scanner, i + _LOOKAHEAD)
+
+        end = None
+        if i < len(tokens) and (tokens[i][0] == '-' or keyword == 'from' and _word(tokens, i) in RANGE_WORDS):
+            parsed_end = _clock(tokens, i + 1)
+            if parsed_end is not None:
+                end, end_explicit, i = parsed_end
+                explicit = explicit or end_explicit
+                if clock.ambiguous and not end.ambiguous:  # "5-7pm", start shares the end's am/pm
+                    hour = clock.hour % 12 + (12 if end.hour >= 12 else 0)
+                    if hour > end.hour:  # "11-1pm" is 11am to 1pm
+                        hour = (hour + 12) % 24
+                    clock = Clock(hour, clock.minute, False)
+                if i + _LOOKAHEAD > len(tokens):
+                    _read(tokens, scanner, i + _LOOKAHEAD)
+        if not _standalone(text, tokens[start][2], tokens[i - 1]):  # "9/11", "10%", "at 5, then"
+            i = start + 1
+            continue
+
+        day = _day(tokens, i)
+        if day is not None:
+            i = day[3]
+        elif day_before is not None and (day_before[1] == start or day_before[1] == start - 1 and tokens[start - 1][0] == 'punct'):
+            day = day_before[0]
+        day_before = None
+
+        if i + 2 > len(tokens):
+            _read(tokens, scanner, i + 2)
+        target = None
+        if _word(tokens, i) == 'for' and i + 1 < len(tokens) and tokens[i + 1][0] in ('mention', 'num', 'word'):
+            target = tokens[i + 1][1] if tokens[i + 1][0] != 'word' else text[tokens[i + 1][2]:tokens[i + 1][3]]
+            i += 2
+
+        # prevent lone hour matches, today and weekdays sit next to plain numbers too often to count ("gen 4 on friday")
+        if not (keyword or explicit or day is not None and day[0] != 0):
+            continue
+        if day is not None and day[2]:
+            clock, end = _tonight(clock), _tonight(end)
+        return TimeMention(
+            start=clock, end=end, day_offset=day[0] if day else 0, weekday=day[1] if day else None,
+            target=target, keyword=keyword, span=(tokens[start][2], tokens[i - 1][3])), tokens[i - 1][3]
+
+
+def resolve(mention, now):
+    """
+    (start, end) datetimes of a mention relative to a timezone aware `now`
+    Ambiguous 12h times give two pairs (pm first), end is None unless it was a range
+    """
+    day = now + timedelta(days=mention.day_offset)
+    if mention.weekday is not None:
+        day += timedelta(days=(mention.weekday - now.weekday()) % 7)
+    starts = mention.start.candidates()
+    ends = mention.end.candidates() if mention.end else [None] * len(starts)
+    if len(ends) != len(starts):  # only one side ambiguous and nothing to infer from
+        ends = ends[:1] * len(starts)
+    times = []
+    for (hour, minute), end in zip(starts, ends):
+        start_dt = day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        end_dt = None
+        if end is not None:
+            end_dt = day.replace(hour=end[0], minute=end[1], second=0, microsecond=0)
+            if end_dt <= start_dt:  # "11pm-1am" runs into the next day
+                end_dt += timedelta(days=1)
+        times.append((start_dt, end_dt))
+    return times
@@ -0,0 +1,301 @@
+import bisect
+import json
+import os
+import re
+import time
+import zoneinfo
+from datetime import datetime, timezone
+
+
+class TimezoneCatalogue:
+    """
+    All available timezones sorted by utc offset, with their rendered "current time" lines
+    Lines only change once a minute, so pages are rendered on demand and cached until the minute rolls over
+    Offsets come from a prebuilt OffsetTable, no ZoneInfo is loaded until someone's time is actually converted
+    """
+
+    def __init__(self, offsets, per_page=100):
+        self.offsets = offsets  # OffsetTable holding every zone, see load_offset_table()
+        self.per_page = per_page
+        now = time.time()
+        self.names = sorted(offsets.names, key=lambda tz: (offsets.offset(tz, now), tz))
+        self.name_set = frozenset(self.names)
+        self.page_count = (len(self.names) - 1) // per_page + 1
+        self._minute = None
+        self._pages = {}
+
+    def __contains__(self, tz):
+        return tz in self.name_set
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def zone(self, tz):
+        """ZoneInfo of a listed zone, None for anything else"""
+        return zoneinfo.ZoneInfo(tz) if tz in self.name_set else None
+
+    def page(self, index):
+        """Rendered lines of a page, `- Zone/Name ▪ Monday, 01:30 PM`"""
+        minute = int(time.time() // 60)
+        if minute != self._minute:
+            self._minute = minute
+            self._pages.clear()
+        if index not in self._pages:
+            now = time.time()
+            self._pages[index] = "\n".join(
+                f"- {tz} ▪ {wall_clock(now, self.offsets.offset(tz, now)).strftime('%A, %I:%M %p')}"
+                for tz in self.names[index * self.per_page:(index + 1) * self.per_page])
+        return self._pages[index]
+
+
+# common abbreviations/names people type instead of the tz database name, best guess first
+ALIASES = {
+    "ist": ["Asia/Kolkata"], "india": ["Asia/Kolkata"],
+    "pst": ["America/Los_Angeles"], "pdt": ["America/Los_Angeles"], "pacific": ["America/Los_Angeles"],
+    "mst": ["America/Denver", "America/Phoenix"], "mdt": ["America/Denver"],
+    "cst": ["America/Chicago", "Asia/Shanghai"], "cdt": ["America/Chicago"], "central": ["America/Chicago"],
+    "est": ["America/New_York"], "edt": ["America/New_York"], "eastern": ["America/New_York"],
+    "ast": ["America/Halifax"], "akst": ["America/Anchorage"], "hst": ["Pacific/Honolulu"],
+    "gmt": ["Europe/London", "GMT"], "bst": ["Europe/London", "Asia/Dhaka"], "uk": ["Europe/London"],
+    "cet": ["Europe/Paris", "Europe/Berlin"], "cest": ["Europe/Paris", "Europe/Berlin"],
+    "eet": ["Europe/Athens", "Africa/Cairo"], "msk": ["Europe/Moscow"], "gst": ["Asia/Dubai"],
+    "pkt": ["Asia/Karachi"], "npt": ["Asia/Kathmandu"], "wib": ["Asia/Jakarta"], "pht": ["Asia/Manila"],
+    "sgt": ["Asia/Singapore"], "hkt": ["Asia/Hong_Kong"], "jst": ["Asia/Tokyo"], "kst": ["Asia/Seoul"],
+    "awst": ["Australia/Perth"], "aest": ["Australia/Sydney"], "aedt": ["Australia/Sydney"],
+    "nzst": ["Pacific/Auckland"], "nzdt": ["Pacific/Auckland"], "brt": ["America/Sao_Paulo"],
+    "art": ["America/Argentina/Buenos_Aires"], "wat": ["Africa/Lagos"], "sast": ["Africa/Johannesburg"],
+}
+_separators = re.compile(r'[/_\-\s]+')
+
+
+def _normalize(text):
+    return _separators.sub(' ', text.lower()).strip()
+
+
+def _trigrams(text, padded=True):
+    if padded:  # word edges count, so typos at the start or end of a name still share trigrams with it
+        text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TimezoneSearch:
+    """
+    Prebuilt index for timezone autocomplete
+    Ranks: alias > exact name > name prefix > every word starts a segment > substring > typo (trigram overlap)
+    """
+
+    def __init__(self, names, aliases=ALIASES, limit=20, cache_size=4096):
+        self.names = list(names)
+        self.limit = limit
+        self.cache_size = cache_size
+        self._results = {}  # normalized query -> ranked names
+        self._normalized = [_normalize(name) for name in self.names]
+        self._exact = {name.lower(): i for i, name in enumerate(self.names)}
+        # tie breaker, shorter names first
+        self._order = [0] * len(self.names)
+        for rank, i in enumerate(sorted(range(len(self.names)), key=lambda i: (len(self.names[i]), self.names[i]))):
+            self._order[i] = rank
+        self._name_prefixes = {}  # prefix of the whole normalized name -> zone indexes
+        self._prefixes = {}  # word prefix -> {zone index: weight}, a flattened trie
+        self._trigrams = {}  # padded trigram -> zone indexes, for typos
+        self._inner_trigrams = {}  # unpadded trigram -> zone indexes, for substrings that start or end mid-word
+        for i, normalized in enumerate(self._normalized):
+            words = normalized.split(' ')
+            for pos, word in enumerate(words):
+                weight = 2 if pos == len(words) - 1 else 1  # the city is what people usually type
+                for end in range(1, len(word) + 1):
+                    bucket = self._prefixes.setdefault(word[:end], {})
+                    if bucket.get(i, 0) < weight:
+                        bucket[i] = weight
+            for end in range(1, len(normalized) + 1):
+                self._name_prefixes.setdefault(normalized[:end], set()).add(i)
+            for gram in _trigrams(normalized):
+                self._trigrams.setdefault(gram, set()).add(i)
+            for gram in _trigrams(normalized, padded=False):
+                self._inner_trigrams.setdefault(gram, set()).add(i)
+        self._aliases = {}
+        for alias, zones in aliases.items():
+            ids = [self._exact[zone.lower()] for zone in zones if zone.lower() in self._exact]
+            if ids:
+                self._aliases[alias] = ids
+
+    def search(self, query):
+        """Top `limit` zone names for what has been typed so far"""
+        query = _normalize(query)
+        if query in self._results:
+            return self._results[query]
+        results = self._search(query) if query else self.names[:self.limit]
+        if len(self._results) >= self.cache_size:  # zone names never change, so results only need a size cap
+            self._results.pop(next(iter(self._results)))
+        self._results[query] = results
+        return results
+
+    def _search(self, query):
+        # every typed word has to start a segment, intersect starting from the rarest word
+        buckets = sorted((self._prefixes.get(word, {}) for word in query.split(' ')), key=len)
+        matched = buckets[0]
+        for bucket in buckets[1:]:
+            matched = {i: w + bucket[i] for i, w in matched.items() if i in bucket}
+        starts = self._name_prefixes.get(query, ())
+        scores = {i: 90 if i in starts else 70 + weight for i, weight in matched.items()}
+
+        def bump(index, score):
+            if scores.get(index, 0) < score:
+                scores[index] = score
+
+        for rank, i in enumerate(self._aliases.get(query, ())):
+            bump(i, 100 - rank)
+        exact = self._exact.get(query.replace(' ', '_'))
+        if exact is None:
+            exact = self._exact.get(query.replace(' ', '/'))
+        if exact is not None:
+            bump(exact, 95)
+
+        if len(scores) < self.limit:
+            # a substring contains all of its unpadded trigrams, so the rarest one bounds the candidates
+            inner = [self._inner_trigrams.get(gram, ()) for gram in _trigrams(query, padded=False)]
+            for i in min(inner, key=len) if inner else range(len(self.names)):  # under 3 letters, check every zone
+                if query in self._normalized[i]:
+                    bump(i, 60)
+            if not scores and len(query) > 3:  # typo tolerance, at least half the trigrams match
+                grams = _trigrams(query)
+                buckets = [self._trigrams.get(gram, ()) for gram in grams]
+                hits = {}
+                for bucket in buckets:
+                    for i in bucket:
+                        hits[i] = hits.get(i, 0) + 1
+                for i, count in hits.items():
+                    if count * 2 >= len(grams):
+                        bump(i, 50 * count / len(grams))
+
+        # only a handful of distinct scores, so rank per score group and stop once the limit is filled
+        groups = {}
+        for i, score in scores.items():
+            groups.setdefault(score, []).append(i)
+        ranked = []
+        for score in sorted(groups, reverse=True):
+            ranked.extend(sorted(groups[score], key=self._order.__getitem__))
+            if len(ranked) >= self.limit:
+                break
+        return [self.names[i] for i in ranked[:self.limit]]
+
+
+class OffsetTable:
+    """
+    UTC offset and DST transitions of each zone over the next `days` days
+    Built lazily per zone the first time it is asked for, after that converting an instant is a bisect, no tz maths
+    """
+
+    def __init__(self, days=400):
+        self.days = days
+        self._tables = {}  # name -> (transition timestamps, offsets in seconds, valid until)
+
+    @property
+    def names(self):
+        """Zones built so far"""
+        return list(self._tables)
+
+    def _offset(self, zone, ts):
+        return int(datetime.fromtimestamp(ts, zone).utcoffset().total_seconds())
+
+    def _build(self, name, start):
+        # sample once a day, then bisect down to the second wherever the offset changed
+        zone = zoneinfo.ZoneInfo(name)
+        starts, offsets = [start], [self._offset(zone, start)]
+        for day in range(1, self.days + 1):
+            ts = start + day * 86400
+            offset = self._offset(zone, ts)
+            if offset != offsets[-1]:
+                low, high = ts - 86400, ts
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._offset(zone, middle) == offsets[-1]:
+                        low = middle
+                    else:
+                        high = middle
+                starts.append(high)
+                offsets.append(offset)
+        table = self._tables[name] = (starts, offsets, start + self.days * 86400)
+        return table
+
+    def offset(self, name, ts):
+        """UTC offset in seconds of a zone at a unix timestamp"""
+        table = self._tables.get(name)
+        if table is None or not table[0][0] <= ts < table[2]:
+            table = self._build(name, int(min(ts, time.time())) - 86400)
+        starts, offsets, _ = table
+        return offsets[bisect.bisect_right(starts, ts) - 1]
+
+    def group(self, zone_counts, ts):
+        """{offset seconds: count} for a {zone name: count} mapping at one instant"""
+        groups = {}
+        for name, count in zone_counts.items():
+            offset = self.offset(name, ts)
+            groups[offset] = groups.get(offset, 0) + count
+        return groups
+
+
+def tzdata_version():
+    """
+    Which tz database zoneinfo reads and which release of it, None if that can't be told
+    zoneinfo looks through TZPATH first and falls back to the tzdata package
+    """
+    for root in zoneinfo.TZPATH:
+        if not os.path.isdir(root):
+            continue
+        path = os.path.join(root, "tzdata.zi")
+        if not os.path.exists(path):  # not every distro ships it, the directory's mtime has to do
+            return f"{root} {os.stat(root).st_mtime_ns}"
+        with open(path) as fp:
+            return f"{root} {fp.readline().strip()} {os.stat(path).st_mtime_ns}"  # first line is `# version 2024a`
+    try:
+        import tzdata
+    except ImportError:
+        return None
+    return f"tzdata {tzdata.IANA_VERSION}"
+
+
+def load_offset_table(path, days=400, margin=30):
+    """
+    OffsetTable with every available zone built, read from `path` when it was built from the same tz database and
+    still covers the next `margin` days, otherwise built from scratch (about half a second) and saved there
+    """
+    source = tzdata_version()
+    now = time.time()
+    table = OffsetTable(days)
+    try:
+        with open(path) as fp:
+            cached = json.load(fp)
+    except (OSError, ValueError):
+        cached = None
+    if (cached and source is not None and cached["source"] == source and cached["days"] == days
+            and cached["start"] <= now < cached["start"] + (days - margin) * 86400):
+        until = cached["start"] + days * 86400
+        table._tables = {name: (starts, offsets, until) for name, (starts, offsets) in cached["zones"].items()}
+        return table
+
+    start = int(now) - 86400
+    for name in sorted(zoneinfo.available_timezones()):
+        table._build(name, start)
+    if source is not None:  # nothing to tell a stale file from a fresh one otherwise
+        cached = {"source": source, "days": days, "start": start,
+                  "zones": {name: [starts, offsets] for name, (starts, offsets, _) in table._tables.items()}}
+        with open(path + ".tmp", "w") as fp:
+            json.dump(cached, fp, separators=(",", ":"))
+        os.replace(path + ".tmp", path)  # a crash mid-write never leaves a truncated cache behind
+    return table
+
+
+def format_offset(offset):
+    """UTC+05:30 style label of an offset in seconds"""
+    sign = "-" if offset < 0 else "+"
+    hours, minutes = divmod(abs(offset) // 60, 60)
+    return f"UTC{sign}{hours:02}:{minutes:02}"
+
+
+def wall_clock(ts, offset):
+    """Naive local datetime of a unix timestamp at a given offset"""
+    return datetime.fromtimestamp(ts + offset, timezone.utc).replace(tzinfo=None)